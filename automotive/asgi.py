@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'automotive.settings')
 
 application = get_asgi_application()
+
+# build the shared AWS clients before the first request hits this worker
+from main.aws import warm_clients
+
+warm_clients()
@@ -0,0 +1,128 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    """Per-request routing flags, stored in a context variable."""
+
+    def __init__(self, pinned=False):
+        self.replica_reads = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_reads(view):
+    """Allow the reads of ``view`` to be served by a replica."""
+    view.replica_reads = True
+    return view
+
+
+@contextmanager
+def unrouted():
+    """Route the block as if outside any request.
+
+    For bookkeeping writes, such as flushing shared counters, that should
+    neither pin the request to the primary nor set its pin cookie.
+    """
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads of replica-enabled views to a replica until the request writes.
+
+    Outside such views (admin, management commands, migrations) and inside
+    transactions everything stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.pinned or not state.replica_reads:
+            return PRIMARY
+        # reads inside a transaction on the primary must see its uncommitted rows
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        replicas = settings.DATABASE_REPLICAS
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Track replica routing for each request.
+
+    Unsafe methods go to the primary throughout. A request that writes also
+    sets a short-lived cookie, so the redirect that follows still reads its
+    own writes while the replicas catch up.
+    """
+
+    cookie_name = 'db_pin'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        pinned = (request.method not in ('GET', 'HEAD', 'OPTIONS')
+                  or self.cookie_name in request.COOKIES)
+        return RoutingState(pinned=pinned)
+
+    def finish(self, state, response):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(self.cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _routing.get()
+        if state is not None and getattr(view_func, 'replica_reads', False):
+            state.replica_reads = True
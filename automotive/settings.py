@@ -59,7 +59,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'automotive.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'automotive.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,7 +74,7 @@ ROOT_URLCONF = 'automotive.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'automotive.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -102,17 +104,49 @@ DATABASES = {
 '''
 
 # Amazon RDS PostgreSQL database - markup
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': env("DB_NAME"),
-        'USER': env("DB_USER"),
-        'PASSWORD': env("DB_PASSWORD"),
-        'HOST': env("DB_HOST"),
-        'PORT': env("DB_PORT"),
+# USE_SQLITE=True runs against a local SQLite file instead (offline tests, the
+# search subsystem falls back to icontains ranking there)
+
+if env.bool('USE_SQLITE', default=False):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
+    # a second SQLite file acting as a read replica, mirrored to the primary in tests
+    if env.bool('SQLITE_REPLICA', default=False):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.replica.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env("DB_NAME"),
+            'USER': env("DB_USER"),
+            'PASSWORD': env("DB_PASSWORD"),
+            'HOST': env("DB_HOST"),
+            'PORT': env("DB_PORT"),
+            # keep connections open between requests, checked before reuse
+            'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    # read replicas, e.g. DB_REPLICA_HOSTS=replica-1.rds.amazonaws.com,replica-2...
+    for number, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[]), start=1):
+        DATABASES[f'replica_{number}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['automotive.routers.ReplicaRouter']
+# how long a client keeps reading from the primary after it wrote something
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=5)
 
 
 
@@ -120,6 +154,13 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# Sessions are read from the cache and written through to the database, and
+# request.user (with profile and location) is cached per user. Both need
+# CACHE_URL to name a cache every worker shares, see below.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=300)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -145,16 +186,59 @@ AWS_SESSION_TOKEN = env("AWS_SESSION_TOKEN")
 
 SNS_TOPIC_ARN = env("SNS_TOPIC_ARN")
 
+# Shared boto3 clients (main.aws), one pool per service per worker process
+AWS_MAX_POOL_CONNECTIONS = env.int('AWS_MAX_POOL_CONNECTIONS', default=25)
+AWS_CONNECT_TIMEOUT = env.float('AWS_CONNECT_TIMEOUT', default=2.0)
+AWS_READ_TIMEOUT = env.float('AWS_READ_TIMEOUT', default=10.0)
+AWS_TCP_KEEPALIVE = env.bool('AWS_TCP_KEEPALIVE', default=True)
+AWS_MAX_ATTEMPTS = env.int('AWS_MAX_ATTEMPTS', default=3)
+AWS_WARM_SERVICES = env.list('AWS_WARM_SERVICES', default=['sns', 's3'])
+# threads the async views may block on boto3 at once
+AWS_THREAD_POOL_SIZE = env.int('AWS_THREAD_POOL_SIZE', default=8)
+# point at a local stand-in (moto, MinIO, LocalStack) when set
+AWS_S3_ENDPOINT_URL = env('AWS_S3_ENDPOINT_URL', default=None)
+AWS_SNS_ENDPOINT_URL = env('AWS_SNS_ENDPOINT_URL', default=None)
+
+# Listing images are uploaded by the browser straight to S3 with a presigned POST
+LISTING_UPLOAD_MAX_BYTES = env.int('LISTING_UPLOAD_MAX_BYTES', default=15 * 1024 * 1024)
+LISTING_UPLOAD_CONTENT_TYPES = env.list(
+    'LISTING_UPLOAD_CONTENT_TYPES', default=['image/jpeg', 'image/png', 'image/webp'])
+LISTING_UPLOAD_EXPIRES = env.int('LISTING_UPLOAD_EXPIRES', default=10 * 60)
+
+# Django's default handlers, hashing uploads as they stream in for main.blobs
+FILE_UPLOAD_HANDLERS = [
+    'main.blobs.HashingMemoryFileUploadHandler',
+    'main.blobs.HashingTemporaryFileUploadHandler',
+]
+
+# Enquiry notifications are queued in the outbox and sent by `manage.py drain_outbox`
+NOTIFICATION_PUBLISHER = env('NOTIFICATION_PUBLISHER', default='main.sns_email.SNSPublisher')
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=50)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=8)
+OUTBOX_RETRY_BASE_SECONDS = env.int('OUTBOX_RETRY_BASE_SECONDS', default=30)
+OUTBOX_RETRY_MAX_SECONDS = env.int('OUTBOX_RETRY_MAX_SECONDS', default=60 * 60)
+# a claimed batch is left to its worker this long, then retried by another
+OUTBOX_LEASE_SECONDS = env.int('OUTBOX_LEASE_SECONDS', default=5 * 60)
+
+# ASYNC_VIEWS=True serves home, listing and enquiry pages from main.async_views
+# (run under automotive.asgi). Enquiries are then also published right away,
+# with the outbox worker as the fallback; the worker leaves them alone for
+# OUTBOX_DISPATCH_HOLD_SECONDS while that attempt runs.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+OUTBOX_IMMEDIATE_DISPATCH = env.bool('OUTBOX_IMMEDIATE_DISPATCH', default=ASYNC_VIEWS)
+OUTBOX_DISPATCH_HOLD_SECONDS = env.int('OUTBOX_DISPATCH_HOLD_SECONDS', default=60)
+OUTBOX_DISPATCH_TIMEOUT = env.float('OUTBOX_DISPATCH_TIMEOUT', default=2.0)
+
 STORAGES = {
 
     # Media file (image) management   
     "default": {
-        "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
+        "BACKEND": "main.storage.PooledS3StaticStorage",
     },
     
     # CSS and JS file management
     "staticfiles": {
-        "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
+        "BACKEND": "main.storage.PooledS3StaticStorage",
     },
 }
 
@@ -163,6 +247,48 @@ STORAGES = {
 LOGIN_REDIRECT_URL = '/home/'
 LOGIN_URL= '/login/'
 
+# Cache, e.g. CACHE_URL=redis://host:6379/1. Required outside DEBUG: sessions,
+# cached users and the cache version tokens must be seen by every worker, and
+# the default local-memory cache is private to one process. ALLOW_LOCAL_CACHE
+# lifts the system check for single-process runs such as the offline tests.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+ALLOW_LOCAL_CACHE = env.bool('ALLOW_LOCAL_CACHE', default=env.bool('USE_SQLITE', default=False))
+
+# Listings grid settings
+LISTINGS_PAGE_SIZE = env.int('LISTINGS_PAGE_SIZE', default=24)
+PROFILE_LISTINGS_PAGE_SIZE = env.int('PROFILE_LISTINGS_PAGE_SIZE', default=20)
+LISTINGS_API_MAX_PAGE_SIZE = env.int('LISTINGS_API_MAX_PAGE_SIZE', default=100)
+# rows fetched per server-side cursor round trip by the streaming exports
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+# Stream the home grid: head and filters first, then cards as rows arrive
+HOME_STREAMING = env.bool('HOME_STREAMING', default=False)
+HOME_STREAM_PAGE_SIZE = env.int('HOME_STREAM_PAGE_SIZE', default=LISTINGS_PAGE_SIZE)
+HOME_STREAM_CHUNK_SIZE = env.int('HOME_STREAM_CHUNK_SIZE', default=12)
+LISTING_CARD_CACHE_TIMEOUT = env.int('LISTING_CARD_CACHE_TIMEOUT', default=60 * 60 * 24)
+LISTING_DETAIL_CACHE_TIMEOUT = env.int('LISTING_DETAIL_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+# Similar listings: per-process NumPy index, refreshed when older than
+# SIMILAR_INDEX_MAX_AGE seconds from SIMILAR_INDEX_PATH (written by
+# manage.py build_similarity_index, e.g. from cron) if set, otherwise by a
+# background thread in each worker unless SIMILAR_INDEX_REBUILD is off
+SIMILAR_LISTINGS_COUNT = env.int('SIMILAR_LISTINGS_COUNT', default=6)
+SIMILAR_INDEX_MAX_AGE = env.int('SIMILAR_INDEX_MAX_AGE', default=15 * 60)
+SIMILAR_INDEX_PATH = env('SIMILAR_INDEX_PATH', default=None)
+SIMILAR_INDEX_REBUILD = env.bool('SIMILAR_INDEX_REBUILD', default=True)
+
+# Saved search alerts: matches inserted per query, matches per digest run
+SAVED_SEARCH_MATCH_BATCH_SIZE = env.int('SAVED_SEARCH_MATCH_BATCH_SIZE', default=1000)
+SAVED_SEARCH_DIGEST_LIMIT = env.int('SAVED_SEARCH_DIGEST_LIMIT', default=5000)
+
+# Listing view counters: buffered per process and flushed after
+# VIEW_COUNT_FLUSH_INTERVAL seconds or VIEW_COUNT_FLUSH_SIZE views,
+# VIEW_COUNT_BATCH_SIZE listings per UPDATE
+VIEW_COUNT_FLUSH_INTERVAL = env.int('VIEW_COUNT_FLUSH_INTERVAL', default=10)
+VIEW_COUNT_FLUSH_SIZE = env.int('VIEW_COUNT_FLUSH_SIZE', default=1000)
+VIEW_COUNT_BATCH_SIZE = env.int('VIEW_COUNT_BATCH_SIZE', default=500)
+
 # Messages Settings
 MESSAGE_TAGS= {
     messages.ERROR: 'danger',
@@ -207,4 +333,24 @@ EMAIL_HOST_PASSWORD = ("AWS_SES_SMTP_PASSWORD")  # SMTP password
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Per-request instrumentation: share of requests (0.0-1.0) that get a
+# Server-Timing header and a JSON log line on the automotive.timing logger.
+# The log lines are printed only with TIMING_LOG_LEVEL=INFO.
+SERVER_TIMING_SAMPLE_RATE = env.float('SERVER_TIMING_SAMPLE_RATE', default=0.05)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'automotive.timing': {
+            'handlers': ['console'],
+            'level': env('TIMING_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
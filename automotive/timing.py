@@ -0,0 +1,239 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+_timings = ContextVar('request_timings', default=None)
+
+# Server-Timing metric name -> description shown in the browser's network panel
+METRICS = {
+    'db': 'SQL',
+    'tpl': 'Templates',
+    'aws': 'AWS calls',
+    'storage': 'Storage URLs',
+}
+
+# counters without a duration, reported as "name;desc=..." entries
+MARKS = {
+    'auth_hit': 'User from cache',
+    'auth_miss': 'User from DB',
+    'detail_hit': 'Listing page from cache',
+    'detail_miss': 'Listing page rendered',
+}
+
+
+class RequestTimings:
+    """Milliseconds and counts collected for one sampled request."""
+
+    def __init__(self):
+        self.durations = Counter()
+        self.counts = Counter()
+        # executions per SQL template, and per template and parameters
+        self.statements = Counter()
+        self.executions = Counter()
+        self.template_depth = 0
+
+    def add(self, metric, duration):
+        self.durations[metric] += duration
+        self.counts[metric] += 1
+
+    @property
+    def repeated(self):
+        """SQL run more than once with any parameters, the shape of an N+1."""
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+    @property
+    def duplicates(self):
+        """``(sql, params)`` run more than once, results that could have been reused."""
+        return {key: count for key, count in self.executions.items() if count > 1}
+
+    def server_timing(self, total):
+        parts = [f'{name};dur={self.durations[name]:.1f};desc="{desc} ({self.counts[name]})"'
+                 for name, desc in METRICS.items() if self.counts[name]]
+        parts += [f'{name};desc="{desc} ({self.counts[name]})"'
+                  for name, desc in MARKS.items() if self.counts[name]]
+        repeated = sum(count - 1 for count in self.repeated.values())
+        if repeated:
+            parts.append(f'rep;desc="{repeated} repeated queries"')
+        duplicated = sum(count - 1 for count in self.duplicates.values())
+        if duplicated:
+            parts.append(f'dup;desc="{duplicated} duplicate queries"')
+        parts.append(f'total;dur={total:.1f}')
+        return ', '.join(parts)
+
+
+def current():
+    """The timings of the request being sampled, or ``None``."""
+    return _timings.get()
+
+
+def mark(name):
+    """Count an event such as a cache hit when the request is sampled."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.counts[name] += 1
+
+
+@contextmanager
+def timed(metric):
+    """Add the duration of the block to ``metric`` when the request is sampled."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(metric, (time.perf_counter() - started) * 1000)
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook counting and timing each statement."""
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    # an N+1 runs one statement with different parameters, a duplicate repeats both
+    timings.statements[sql] += 1
+    timings.executions[(sql, repr(params))] += 1
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def aws_before_call(context, **kwargs):
+    context['timing_started'] = time.perf_counter()
+
+
+def aws_after_call(context, **kwargs):
+    timings = _timings.get()
+    started = context.pop('timing_started', None)
+    if timings is not None and started is not None:
+        timings.add('aws', (time.perf_counter() - started) * 1000)
+
+
+class TimedTemplate:
+    """Wraps a backend template so that only the outermost render is timed."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = _timings.get()
+        if timings is None or timings.template_depth:
+            return self.template.render(context, request)
+        timings.template_depth += 1
+        try:
+            with timed('tpl'):
+                return self.template.render(context, request)
+        finally:
+            timings.template_depth -= 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates that reports render time to the Server-Timing middleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def install_query_recorder(connection, **kwargs):
+    """Hook ``record_query`` into ``connection``; it is a no-op outside sampled requests.
+
+    Installed once per connection rather than per request so that queries
+    made from async views, which run on other threads' connections, are
+    still seen.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class ServerTimingMiddleware:
+    """Time a sample of requests and report them in a ``Server-Timing`` header.
+
+    ``SERVER_TIMING_SAMPLE_RATE`` is the share of requests measured; the rest
+    only pay for one ``random()`` call. Sampled requests also log one JSON
+    line on the ``automotive.timing`` logger.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def finish(self, request, response, timings, started):
+        total = (time.perf_counter() - started) * 1000
+        response['Server-Timing'] = timings.server_timing(total)
+        self.log(request, response, timings, total)
+        return response
+
+    def log(self, request, response, timings, total):
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total, 1),
+            'queries': timings.counts['db'],
+            'repeated_queries': sum(count - 1 for count in timings.repeated.values()),
+            'duplicate_queries': sum(count - 1 for count in timings.duplicates.values()),
+            **{f'{name}_ms': round(timings.durations[name], 1) for name in METRICS},
+            'aws_calls': timings.counts['aws'],
+            **{name: timings.counts[name] for name in MARKS},
+        }
+        if timings.repeated:
+            line['most_repeated_sql'] = max(timings.repeated, key=timings.repeated.get)
+        if timings.duplicates:
+            sql, _ = max(timings.duplicates, key=timings.duplicates.get)
+            line['most_duplicated_sql'] = sql
+        logger.info(json.dumps(line))
@@ -1,13 +1,38 @@
 from django.contrib import admin
 
-from .models import Listing
+from .exports import streaming_export_response
+from .models import Listing, OutboxMessage, SavedSearch
 
 class ListingAdmin(admin.ModelAdmin):
     readonly_fields=('id',)
+    list_display = ('model', 'brand', 'transmission', 'seller', 'created_at')
+    list_filter = ('brand', 'transmission')
+    search_fields = ('model',)
+    list_select_related = ('seller__user',)
+    actions = ['export_csv', 'export_jsonl']
+
+    @admin.action(description='Export selected listings as CSV')
+    def export_csv(self, request, queryset):
+        return streaming_export_response(queryset, 'csv')
+
+    @admin.action(description='Export selected listings as JSON Lines')
+    def export_jsonl(self, request, queryset):
+        return streaming_export_response(queryset, 'jsonl')
     
 admin.site.register(Listing,ListingAdmin)
 
 
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
 
 
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'profile', 'created_at')
+    list_filter = ('brand', 'transmission')
+    list_select_related = ('profile__user',)
 
+admin.site.register(SavedSearch, SavedSearchAdmin)
@@ -0,0 +1,149 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.db.models import Count, F, Max, Sum
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from automotive.routers import replica_reads
+
+from .facets import facet_counts
+from .filters import ListingFilter
+from .models import Listing, ListingFacet
+from .pagination import InvalidCursor, paginate
+from .similar import similar_listing_ids
+from .utils import parse_uuid
+
+# API name -> ORM lookup, fetched with .values() so no model instances are built
+SUMMARY_FIELDS = {
+    'id': 'id',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'brand': 'brand',
+    'model': 'model',
+    'mileage': 'mileage',
+    'transmission': 'transmission',
+    'image': 'image',
+    'view_count': 'view_count',
+    'seller_name': 'seller__user__username',
+}
+DETAIL_FIELDS = {
+    **SUMMARY_FIELDS,
+    'vin': 'vin',
+    'color': 'color',
+    'engine': 'engine',
+    'description': 'description',
+    'phone_number': 'seller__phone_number',
+    'city': 'location__city',
+    'county': 'location__state',
+    'zip_code': 'location__zip_code',
+}
+
+
+def _values(queryset, fields):
+    plain = [name for name, lookup in fields.items() if name == lookup]
+    aliased = {name: F(lookup) for name, lookup in fields.items() if name != lookup}
+    return queryset.values(*plain, **aliased)
+
+
+def _serialize(row):
+    if row.get('image'):
+        row['image'] = default_storage.url(row['image'])
+    return row
+
+
+def _search_state(request):
+    # one aggregate over the filtered rows, cached for the etag and last-modified checks
+    if not hasattr(request, '_listings_state'):
+        queryset = ListingFilter(request.GET, queryset=Listing.objects.all()).qs
+        request._listings_state = queryset.order_by().aggregate(
+            last_modified=Max('updated_at'), count=Count('id'), views=Sum('view_count'))
+    return request._listings_state
+
+
+def _search_etag(request):
+    state = _search_state(request)
+    facets = sorted(ListingFacet.objects.values_list('brand', 'transmission', 'count'))
+    # the count catches deletes and the views flushed counts, neither moves updated_at
+    raw = (f"{request.GET.urlencode()}|{state['count']}|{state['views']}|"
+           f"{state['last_modified']}|{facets}")
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _search_last_modified(request):
+    return _search_state(request)['last_modified']
+
+
+@replica_reads
+@login_required
+@require_GET
+@condition(etag_func=_search_etag, last_modified_func=_search_last_modified)
+def listings_api(request):
+    listing_filter = ListingFilter(request.GET, queryset=Listing.objects.all())
+    if not listing_filter.is_valid():
+        return JsonResponse({'errors': listing_filter.errors}, status=400)
+    ordering = listing_filter.ordering
+    fields = SUMMARY_FIELDS
+    if ordering[0] == '-rank':
+        fields = {**SUMMARY_FIELDS, 'rank': 'rank'}
+    queryset = _values(listing_filter.qs, fields)
+    try:
+        page_size = int(request.GET.get('page_size', settings.LISTINGS_PAGE_SIZE))
+        page_size = max(1, min(page_size, settings.LISTINGS_API_MAX_PAGE_SIZE))
+        page = paginate(queryset, request.GET.get('cursor'), page_size, ordering)
+    except (InvalidCursor, ValueError):
+        return JsonResponse({'errors': {'cursor': ['Invalid cursor or page size.']}},
+                            status=400)
+    return JsonResponse({
+        'facets': facet_counts(request.GET.get('brand'), request.GET.get('transmission')),
+        'results': [_serialize(row) for row in page],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+def _detail_state(request, id):
+    if not hasattr(request, '_listing_state'):
+        listing_id = parse_uuid(id)
+        request._listing_state = listing_id and Listing.objects.filter(
+            id=listing_id).values_list('updated_at', 'view_count').first()
+    return request._listing_state or (None, None)
+
+
+def _detail_updated_at(request, id):
+    return _detail_state(request, id)[0]
+
+
+def _detail_etag(request, id):
+    updated_at, view_count = _detail_state(request, id)
+    return updated_at and f'{id}-{updated_at.timestamp()}-{view_count}'
+
+
+@replica_reads
+@login_required
+@require_GET
+@condition(etag_func=_detail_etag, last_modified_func=_detail_updated_at)
+def listing_detail_api(request, id):
+    listing_id = parse_uuid(id)
+    row = listing_id and _values(Listing.objects.filter(id=listing_id), DETAIL_FIELDS).first()
+    if not row:
+        return JsonResponse({'errors': {'id': ['Listing not found.']}}, status=404)
+    return JsonResponse(_serialize(row))
+
+
+@replica_reads
+@login_required
+@require_GET
+def similar_listings_api(request, id):
+    listing_id = parse_uuid(id)
+    ranked = listing_id and similar_listing_ids(listing_id)
+    if ranked is None:
+        return JsonResponse({'errors': {'id': ['Listing not found.']}}, status=404)
+    distances = dict(ranked)
+    rows = {row['id']: row for row in _values(
+        Listing.objects.filter(id__in=distances), SUMMARY_FIELDS)}
+    return JsonResponse({'results': [
+        {**_serialize(rows[similar_id]), 'distance': round(distance, 4)}
+        for similar_id, distance in ranked if similar_id in rows]})
@@ -0,0 +1,105 @@
+"""Async versions of the busiest views, used when ``ASYNC_VIEWS`` is on.
+
+The ORM work uses Django's async query methods, template rendering runs
+through ``sync_to_async`` and boto3 calls go to the bounded pool in
+``main.aws``, so a slow AWS endpoint does not hold up the event loop.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect, render
+
+from automotive.routers import replica_reads
+
+from .caching import listing_detail, render_listing_cards
+from .facets import afacet_counts
+from .filters import ListingFilter
+from .models import Listing
+from .outbox import aenqueue, apublish_now
+from .pagination import InvalidCursor, apaginate
+from .similar import similar_listings
+from .streaming import astream_home
+from .utils import parse_uuid
+from .view_counts import flush as flush_view_counts, record_view
+from .views import enquiry_email
+
+# immediate publishes still running after their response was sent
+_background = set()
+
+
+@replica_reads
+@login_required
+async def home_view(request):
+    listings = Listing.objects.select_related('seller__user', 'location')
+    listing_filter = ListingFilter(request.GET, queryset=listings)
+    listing_filter.add_facet_counts(
+        await afacet_counts(request.GET.get('brand'), request.GET.get('transmission')))
+    if settings.HOME_STREAMING:
+        return await astream_home(request, listing_filter)
+    try:
+        page = await apaginate(listing_filter.qs, request.GET.get('cursor'),
+                               settings.LISTINGS_PAGE_SIZE, listing_filter.ordering)
+    except InvalidCursor:
+        page = await apaginate(listing_filter.qs, None, settings.LISTINGS_PAGE_SIZE,
+                               listing_filter.ordering)
+    cards = await sync_to_async(render_listing_cards)(page, await request.auser())
+    return await sync_to_async(render)(request, 'views/home.html', {
+        'listing_filter': listing_filter,
+        'page': page,
+        'cards': cards,
+    })
+
+
+async def _get_listing(id):
+    listing_id = parse_uuid(id)
+    if listing_id is None:
+        return None
+    return await Listing.objects.select_related('seller__user', 'location').filter(
+        id=listing_id).afirst()
+
+
+@replica_reads
+@login_required
+async def listing_view(request, id):
+    listing_id = parse_uuid(id)
+    detail = listing_id and await sync_to_async(listing_detail)(listing_id)
+    if not detail:
+        messages.error(request, f'Invalid UID {id} was provided.')
+        return redirect('home')
+    # buffering is in memory; only the occasional flush needs a thread
+    if record_view(listing_id):
+        await sync_to_async(flush_view_counts)()
+    similar = await sync_to_async(similar_listings)(listing_id)
+    similar_cards = await sync_to_async(render_listing_cards)(similar, await request.auser())
+    return await sync_to_async(render)(request, 'views/listing.html', {
+        'detail': detail,
+        'similar_cards': similar_cards,
+    })
+
+
+@login_required
+async def enquire_listing_by_email(request, id):
+    listing = await _get_listing(id)
+    if listing is None:
+        raise Http404('No Listing matches the given query.')
+    buyer = await request.auser()
+    subject, body = enquiry_email(buyer, listing)
+    immediate = settings.OUTBOX_IMMEDIATE_DISPATCH
+    message = await aenqueue(subject, body, listing=listing, sender=buyer, hold=immediate)
+    if immediate:
+        # wait a little for SNS, then answer anyway and let the publish finish
+        # in the background; the outbox worker picks it up if it fails
+        task = asyncio.ensure_future(apublish_now(message))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        try:
+            await asyncio.wait_for(asyncio.shield(task), settings.OUTBOX_DISPATCH_TIMEOUT)
+        except TimeoutError:
+            pass
+    return JsonResponse({"success": True,
+                         "message": "Enquiry sent! The seller will be emailed shortly."},
+                        status=202)
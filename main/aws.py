@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+
+from automotive.timing import aws_after_call, aws_before_call
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_local = threading.local()
+_executor = None
+_stats = {'client_creations': 0, 'client_reuses': 0, 'resource_creations': 0}
+
+
+def _config():
+    return Config(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_READ_TIMEOUT,
+        tcp_keepalive=settings.AWS_TCP_KEEPALIVE,
+        retries={'max_attempts': settings.AWS_MAX_ATTEMPTS, 'mode': 'standard'},
+    )
+
+
+def _endpoint_url(service):
+    # same naming as django-storages' AWS_S3_ENDPOINT_URL, e.g. AWS_SNS_ENDPOINT_URL
+    return getattr(settings, f'AWS_{service.upper()}_ENDPOINT_URL', None) or None
+
+
+def _get_session():
+    # boto3 sessions are not thread-safe, callers must hold _lock
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            aws_session_token=settings.AWS_SESSION_TOKEN or None,
+            region_name=settings.AWS_S3_REGION_NAME,
+        )
+        # clients and resources copy the session's hooks when they are created
+        _session.events.register('before-parameter-build', aws_before_call)
+        _session.events.register('after-call', aws_after_call)
+        _session.events.register('after-call-error', aws_after_call)
+    return _session
+
+
+def get_client(service):
+    """Return the process-wide client for ``service``.
+
+    botocore clients are thread-safe, so one client (and its connection pool)
+    is shared by every request and thread in the worker.
+    """
+    client = _clients.get(service)
+    if client is not None:
+        with _lock:
+            _stats['client_reuses'] += 1
+        return client
+    with _lock:
+        client = _clients.get(service)
+        if client is None:
+            client = _get_session().client(
+                service, endpoint_url=_endpoint_url(service), config=_config())
+            _clients[service] = client
+            _stats['client_creations'] += 1
+            logger.info('Created AWS %s client', service)
+        else:
+            _stats['client_reuses'] += 1
+    return client
+
+
+def get_resource(service):
+    """Return this thread's boto3 resource for ``service``.
+
+    Resources are not thread-safe, so unlike clients they are kept per thread,
+    but they are still built from the shared session and pool configuration.
+    """
+    resources = getattr(_local, 'resources', None)
+    if resources is None:
+        resources = _local.resources = {}
+    resource = resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = _get_session().resource(
+                service, endpoint_url=_endpoint_url(service), config=_config())
+            _stats['resource_creations'] += 1
+        resources[service] = resource
+    return resource
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.AWS_THREAD_POOL_SIZE,
+                                               thread_name_prefix='aws')
+    return _executor
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """Await a blocking boto3 call from async code.
+
+    Calls run on a pool of ``AWS_THREAD_POOL_SIZE`` threads, so a slow AWS
+    endpoint can tie up at most that many threads however many requests
+    are waiting on it.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+
+def warm_clients():
+    """Create the configured clients up front, once per worker process."""
+    for service in settings.AWS_WARM_SERVICES:
+        get_client(service)
+
+
+def _pool_counters(client):
+    connections = requests = 0
+    manager = getattr(getattr(client._endpoint, 'http_session', None), '_manager', None)
+    pools = getattr(manager, 'pools', None)
+    if pools is not None:
+        for key in pools.keys():
+            pool = pools[key]
+            connections += getattr(pool, 'num_connections', 0)
+            requests += getattr(pool, 'num_requests', 0)
+    return connections, requests
+
+
+def aws_stats():
+    """Client and HTTP connection counters for this process."""
+    with _lock:
+        stats = dict(_stats)
+        clients = list(_clients.values())
+    connections = requests = 0
+    for client in clients:
+        client_connections, client_requests = _pool_counters(client)
+        connections += client_connections
+        requests += client_requests
+    stats.update(
+        connections_opened=connections,
+        requests_sent=requests,
+        connections_reused=max(requests - connections, 0),
+    )
+    return stats
+
+
+@contextmanager
+def override_client(service, client):
+    """Temporarily serve ``client`` for ``service``, e.g. a botocore Stubber'd client."""
+    with _lock:
+        previous = _clients.get(service)
+        _clients[service] = client
+    try:
+        yield client
+    finally:
+        with _lock:
+            if previous is None:
+                _clients.pop(service, None)
+            else:
+                _clients[service] = previous
+
+
+def reset():
+    """Drop every cached client, resource and the thread pool, e.g. after changing
+    endpoints or AWS_THREAD_POOL_SIZE in tests."""
+    global _session, _executor
+    with _lock:
+        _clients.clear()
+        _session = None
+        executor, _executor = _executor, None
+    _local.__dict__.clear()
+    if executor is not None:
+        executor.shutdown(wait=False)
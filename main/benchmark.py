@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import Location, Profile
+from .consts import CARS_BRANDS, TRANSMISSION_OPTIONS
+from .facets import rebuild_facets
+from .models import Listing
+from .similar import rebuild_index
+
+BENCHMARK_PASSWORD = 'benchmark-pass'
+BENCHMARK_PREFIX = 'bench'
+
+COLORS = ('White', 'Black', 'Blue', 'Red', 'Silver', 'Grey', 'Green')
+ENGINES = ('1.0L', '1.6L', '2.0L', '3.0L', '4.0L V8', 'Electric')
+COUNTIES = ('D', 'C', 'G', 'KY', 'LK', 'WD')
+
+# name -> how to build the request from the seeded data
+VIEWS = {
+    'home': lambda data: reverse('home'),
+    'home_filtered': lambda data: reverse('home') + '?brand=bmw&transmission=manual',
+    'listing': lambda data: reverse('listing', kwargs={'id': data['listing_id']}),
+    'profile': lambda data: reverse('profile'),
+    'list': lambda data: reverse('list'),
+}
+
+
+@transaction.atomic
+def seed(users=50, listings=1000, seed=0):
+    """Insert synthetic users, profiles, locations and listings.
+
+    The same ``seed`` always produces the same rows, so runs are comparable.
+    Listings are spread evenly over every brand in ``CARS_BRANDS``.
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)
+    # bulk_create skips the post_save receivers, so profiles and locations are built here
+    accounts = User.objects.bulk_create(
+        User(username=f'{BENCHMARK_PREFIX}{n}', password=password) for n in range(users))
+    locations = Location.objects.bulk_create(_location(rng) for _ in range(users + listings))
+    profiles = Profile.objects.bulk_create(
+        Profile(user=user, location=location, phone_number=f'08{rng.randrange(10**8):08}')
+        for user, location in zip(accounts, locations))
+
+    brands = [brand for brand, _ in CARS_BRANDS]
+    transmissions = [transmission for transmission, _ in TRANSMISSION_OPTIONS]
+    Listing.objects.bulk_create(
+        Listing(
+            seller=profiles[n % users],
+            brand=brands[n % len(brands)],
+            transmission=rng.choice(transmissions),
+            model=f'Model {rng.randrange(1, 100)}',
+            vin=f'{rng.randrange(10**17):017}',
+            mileage=rng.randrange(0, 250000),
+            color=rng.choice(COLORS),
+            engine=rng.choice(ENGINES),
+            description=' '.join(rng.choice(COLORS + ENGINES) for _ in range(30)),
+            location=location,
+            image=f'user_{profiles[n % users].user_id}/listings/car-{n}.jpeg',
+        )
+        for n, location in zip(range(listings), locations[users:]))
+    rebuild_facets()
+    return {'username': accounts[0].username,
+            'listing_id': Listing.objects.filter(seller=profiles[0]).values_list(
+                'id', flat=True).first()}
+
+
+def _location(rng):
+    return Location(address_1=f'{rng.randrange(1, 200)} Main Street', city='Dublin',
+                    state=rng.choice(COUNTIES), zip_code='D02 X285')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(client, url, requests=20, warmup=3, clear_cache=False):
+    """Time ``requests`` GETs of ``url`` after ``warmup`` untimed ones."""
+    for _ in range(warmup):
+        client.get(url)
+    timings, queries, sizes = [], [], []
+    for _ in range(requests):
+        if clear_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}')
+        queries.append(len(captured.captured_queries))
+        sizes.append(len(response.content))
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+        'bytes': max(sizes),
+    }
+
+
+def run_benchmarks(data, views=None, requests=20, warmup=3, clear_cache=False):
+    """Measure each of ``views`` (names from ``VIEWS``) as the first seeded user."""
+    # built up front, as a worker's background rebuild would, so no run waits for it
+    rebuild_index()
+    client = Client()
+    client.force_login(User.objects.get(username=data['username']))
+    return {name: measure(client, VIEWS[name](data), requests, warmup, clear_cache)
+            for name in (views or VIEWS)}
+
+
+def compare(results, baseline, threshold=0.2):
+    """List the regressions of ``results`` against ``baseline``.
+
+    Latency and response size regress when they grow by more than
+    ``threshold`` (a fraction), the query count on any increase.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        limit = previous['p95_ms'] * (1 + threshold)
+        if current['p95_ms'] > limit:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']}ms > {limit:.3f}ms "
+                f"(baseline {previous['p95_ms']}ms + {threshold:.0%})")
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: {current['queries']} queries > baseline {previous['queries']}")
+        if current['bytes'] > previous['bytes'] * (1 + threshold):
+            regressions.append(
+                f"{name}: {current['bytes']} bytes > baseline {previous['bytes']} + {threshold:.0%}")
+    return regressions
@@ -0,0 +1,146 @@
+"""Content-addressed image storage.
+
+Uploaded listing images and profile photos are stored as
+``blobs/<sha256><ext>``, so identical bytes are kept once however many
+listings use them. The upload handlers below hash each file while it
+streams in; files from elsewhere are hashed in chunks when saved. When
+the name is already stored the upload is skipped and its size is added to
+``StoredBlob.bytes_saved``.
+
+Every image that points at a blob holds one reference on its
+``StoredBlob`` row, taken once the row that stores the image is written
+and released when the image is replaced or its listing or profile deleted. The file and its
+variants are deleted with the last reference. Images stored before this,
+and direct uploads, keep their own names and are not counted.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler, TemporaryFileUploadHandler)
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .images import FORMATS, VARIANTS, variant_name
+from .models import StoredBlob
+
+BLOB_PREFIX = 'blobs/'
+
+
+class HashingUploadHandlerMixin:
+    """Hash the chunks this handler keeps and attach ``content_sha256`` to its file."""
+
+    def new_file(self, *args, **kwargs):
+        # set first: the memory handler raises StopFutureHandlers when it takes the file
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            self.sha256.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_sha256(content):
+    digest = getattr(content, 'content_sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, filename):
+    _, ext = os.path.splitext(filename)
+    return f'{BLOB_PREFIX}{digest}{ext.lower()}'
+
+
+def upload_blob(storage, content, filename):
+    """Put ``content`` in ``storage`` unless its hash is already there.
+
+    Returns ``(name, size, uploaded)``. Touches storage only, so it can run
+    in worker threads; ``claim_blob`` records the result.
+    """
+    name = blob_name(content_sha256(content), filename)
+    if storage.exists(name):
+        return name, content.size, False
+    saved = storage.save(name, content)
+    if saved != name:
+        # another upload of the same bytes finished first under the same name
+        storage.delete(saved)
+    return name, content.size, True
+
+
+def claim_blob(name, size, uploaded):
+    """Take one reference on blob ``name``, creating its row on first use."""
+    saved = 0 if uploaded else size
+    updates = {'ref_count': F('ref_count') + 1,
+               'reuse_count': F('reuse_count') + int(not uploaded),
+               'bytes_saved': F('bytes_saved') + saved}
+    if StoredBlob.objects.filter(name=name).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(name=name, size=size, ref_count=1,
+                                      reuse_count=int(not uploaded), bytes_saved=saved)
+    except IntegrityError:
+        StoredBlob.objects.filter(name=name).update(**updates)
+
+
+def release_blob(name, storage=None):
+    """Drop one reference on ``name``, deleting the files with the last one."""
+    if not name or not name.startswith(BLOB_PREFIX):
+        return
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            return
+        blob.delete()
+    transaction.on_commit(lambda: delete_blob_files(storage or default_storage, name))
+
+
+def release_replaced_blob(previous, fieldfile):
+    """Release ``previous`` once a save has replaced it or stored ``fieldfile`` again.
+
+    Saving the same bytes again takes a second reference on the same name,
+    so the old one is released even though the name did not change.
+    """
+    claimed = vars(fieldfile).pop('blob_claimed', False)
+    if previous and (claimed or previous != fieldfile.name):
+        release_blob(previous)
+
+
+def delete_blob_files(storage, name):
+    storage.delete(name)
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            storage.delete(variant_name(name, variant, fmt))
+
+
+def blob_stats():
+    """Totals over every stored blob, including the bytes dedupe has saved."""
+    totals = StoredBlob.objects.aggregate(
+        blobs=Count('id'), stored_bytes=Sum('size'), references=Sum('ref_count'),
+        reused_uploads=Sum('reuse_count'), upload_bytes_saved=Sum('bytes_saved'),
+        storage_bytes_saved=Sum(F('size') * (F('ref_count') - 1), filter=Q(ref_count__gt=1)))
+    return {name: value or 0 for name, value in totals.items()}
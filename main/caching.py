@@ -0,0 +1,136 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from automotive.timing import mark
+
+from .likes import liked_listing_ids
+from .models import Listing
+
+CARD_TEMPLATE = 'components/listing_card.html'
+DETAIL_TEMPLATE = 'components/listing_detail.html'
+CARD_STATS_KEYS = ('cache_stats:card:hits', 'cache_stats:card:misses')
+
+
+def _version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def bump_version(kind, pk):
+    """Invalidate every fragment built from object ``pk`` of ``kind``.
+
+    Versions are random tokens rather than counters so a version key evicted
+    from the cache can never come back with a value an old fragment used.
+    """
+    cache.set(_version_key(kind, pk), uuid.uuid4().hex[:12], None)
+
+
+def get_versions(kind, pks):
+    keys = {pk: _version_key(kind, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    missing = {key: uuid.uuid4().hex[:12] for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {pk: found[key] for pk, key in keys.items()}
+
+
+def _incr(key, delta):
+    if delta:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.add(key, 0, None)
+            cache.incr(key, delta)
+
+
+def render_listing_cards(listings, user):
+    """Render ``listings`` as cards, reusing cached fragments where possible.
+
+    Returns ``(listing, html)`` pairs. A card is keyed on the listing and its
+    seller's versions, plus whether ``user`` owns it (owners get an edit link)
+    and has liked it. The likes of the whole page are looked up in one query.
+    """
+    listings = list(listings)
+    listing_versions = get_versions('listing', {l.pk for l in listings})
+    seller_versions = get_versions('seller', {l.seller_id for l in listings})
+    liked_ids = liked_listing_ids(user, [l.pk for l in listings])
+
+    keys = {}
+    for listing in listings:
+        is_owner = listing.seller.user_id == user.pk
+        keys[listing.pk] = 'card:{}:{}:{}:{:d}:{:d}'.format(
+            listing.pk, listing_versions[listing.pk],
+            seller_versions[listing.seller_id], is_owner, listing.pk in liked_ids)
+    cached = cache.get_many(keys.values())
+
+    cards = []
+    rendered = {}
+    for listing in listings:
+        key = keys[listing.pk]
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {
+                'listing': listing,
+                'is_owner': listing.seller.user_id == user.pk,
+                'is_liked': listing.pk in liked_ids,
+            })
+            rendered[key] = html
+        cards.append((listing, mark_safe(html)))
+    if rendered:
+        cache.set_many(rendered, settings.LISTING_CARD_CACHE_TIMEOUT)
+
+    hits_key, misses_key = CARD_STATS_KEYS
+    _incr(hits_key, len(listings) - len(rendered))
+    _incr(misses_key, len(rendered))
+    return cards
+
+
+def listing_detail(listing_id):
+    """The rendered body of a listing page, or ``None`` if there is no such listing.
+
+    Returns a dict with the listing's ``id``, ``model`` and body ``html``.
+    The entry is keyed on the listing's version and remembers the seller
+    version it was rendered with, so edits to the listing, its location,
+    the seller's profile or user all make it miss. The body holds nothing
+    per user (the CSRF token and enquiry script stay in the page template).
+    """
+    key = 'detail:{}:{}'.format(listing_id, get_versions('listing', {listing_id})[listing_id])
+    entry = cache.get(key)
+    if entry is not None:
+        seller_id = entry['seller_id']
+        if get_versions('seller', {seller_id})[seller_id] == entry['seller_version']:
+            mark('detail_hit')
+            return {**entry, 'html': mark_safe(entry['html'])}
+
+    mark('detail_miss')
+    listing = Listing.objects.select_related('seller__user', 'location').filter(
+        id=listing_id).first()
+    if listing is None:
+        return None
+    entry = {
+        'id': listing.pk,
+        'model': listing.model,
+        'seller_id': listing.seller_id,
+        'seller_version': get_versions('seller', {listing.seller_id})[listing.seller_id],
+        'html': render_to_string(DETAIL_TEMPLATE, {'listing': listing}),
+    }
+    cache.set(key, entry, settings.LISTING_DETAIL_CACHE_TIMEOUT)
+    return {**entry, 'html': mark_safe(entry['html'])}
+
+
+def card_cache_stats():
+    hits, misses = (cache.get(key, 0) for key in CARD_STATS_KEYS)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_card_cache_stats():
+    cache.delete_many(CARD_STATS_KEYS)
@@ -0,0 +1,16 @@
+from django.core.checks import Error, Tags, register
+
+from users.checks import local_cache_in_use
+
+
+@register(Tags.caches)
+def check_cache_versions(app_configs, **kwargs):
+    # a bump in one worker's memory leaves every other worker serving stale
+    # fragments and saved-search indexes until the entries expire
+    if not local_cache_in_use():
+        return []
+    return [Error(
+        'Cache version tokens need a cache shared by every worker.',
+        hint='Set CACHE_URL (e.g. redis://host:6379/1), or ALLOW_LOCAL_CACHE=True '
+             'when a single process serves every request.',
+        id='main.E001')]
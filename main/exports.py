@@ -0,0 +1,73 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# column -> ORM lookup, read with values_list() so rows are plain tuples
+EXPORT_FIELDS = {
+    'id': 'id',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'brand': 'brand',
+    'model': 'model',
+    'vin': 'vin',
+    'mileage': 'mileage',
+    'color': 'color',
+    'engine': 'engine',
+    'transmission': 'transmission',
+    'description': 'description',
+    'image': 'image',
+    'seller': 'seller__user__username',
+    'seller_email': 'seller__user__email',
+    'seller_phone_number': 'seller__phone_number',
+    'address_1': 'location__address_1',
+    'address_2': 'location__address_2',
+    'city': 'location__city',
+    'county': 'location__state',
+    'zip_code': 'location__zip_code',
+}
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object whose write() hands the value back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=None):
+    """Yield listing tuples through a server-side cursor, ``chunk_size`` rows at a time."""
+    rows = (queryset.order_by('created_at', 'id')
+            .values_list(*EXPORT_FIELDS.values()))
+    return rows.iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS.keys())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    columns = list(EXPORT_FIELDS)
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(queryset, fmt, chunk_size=None):
+    rows = export_rows(queryset, chunk_size)
+    return csv_lines(rows) if fmt == 'csv' else jsonl_lines(rows)
+
+
+def streaming_export_response(queryset, fmt):
+    response = StreamingHttpResponse(export_lines(queryset, fmt),
+                                     content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="listings.{fmt}"'
+    return response
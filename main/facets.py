@@ -0,0 +1,53 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Listing, ListingFacet
+
+
+def adjust_facet(brand, transmission, delta):
+    if not delta:
+        return
+    ListingFacet.objects.get_or_create(brand=brand, transmission=transmission)
+    ListingFacet.objects.filter(brand=brand, transmission=transmission).update(
+        count=F('count') + delta)
+
+
+def adjust_facets(counter):
+    """Apply a ``Counter`` of ``(brand, transmission) -> delta``, e.g. after bulk_create."""
+    for (brand, transmission), delta in counter.items():
+        adjust_facet(brand, transmission, delta)
+
+
+@transaction.atomic
+def rebuild_facets():
+    """Recount every brand x transmission pair from the listings table."""
+    rows = (Listing.objects.order_by().values('brand', 'transmission')
+            .annotate(count=Count('id')))
+    ListingFacet.objects.all().delete()
+    ListingFacet.objects.bulk_create(ListingFacet(**row) for row in rows)
+    return len(rows)
+
+
+def _count(facets, brand, transmission):
+    brands, transmissions = Counter(), Counter()
+    for facet in facets:
+        if not transmission or facet.transmission == transmission:
+            brands[facet.brand] += facet.count
+        if not brand or facet.brand == brand:
+            transmissions[facet.transmission] += facet.count
+    return {'brand': dict(brands), 'transmission': dict(transmissions)}
+
+
+def facet_counts(brand=None, transmission=None):
+    """Counts per brand and per transmission.
+
+    Brand counts are restricted to the selected transmission and vice versa,
+    so each number is what picking that option would return.
+    """
+    return _count(ListingFacet.objects.all(), brand, transmission)
+
+
+async def afacet_counts(brand=None, transmission=None):
+    return _count([facet async for facet in ListingFacet.objects.all()], brand, transmission)
@@ -0,0 +1,38 @@
+from django.db import models
+from django.db.models.signals import post_save
+
+
+class ContentAddressedImageField(models.ImageField):
+    """ImageField whose uploads are stored once per content hash, see ``main.blobs``.
+
+    ``upload_to`` is kept for names assigned directly, such as direct uploads
+    that the browser already sent to their own key.
+    """
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        if not cls._meta.abstract:
+            # connected with the model class, so it runs before the receivers in
+            # the apps' signals modules that release the image it replaces
+            post_save.connect(self.claim_stored_blob, sender=cls)
+
+    def pre_save(self, model_instance, add):
+        file = models.Field.pre_save(self, model_instance, add)
+        if file and not file._committed:
+            # imported here because users.models uses this field and main.models imports it
+            from .blobs import upload_blob
+            file.name, size, uploaded = upload_blob(file.storage, file.file, file.name)
+            file.blob_reused = not uploaded
+            # the reference is only taken once the row is written, see claim_stored_blob
+            file.blob_upload = (file.name, size, uploaded)
+            file._committed = True
+        return file
+
+    def claim_stored_blob(self, sender, instance, **kwargs):
+        """Take the reference of a blob stored by ``pre_save``, in the save's transaction."""
+        file = getattr(instance, self.attname)
+        upload = vars(file).pop('blob_upload', None)
+        if upload is not None:
+            from .blobs import claim_blob
+            claim_blob(*upload)
+            file.blob_claimed = True
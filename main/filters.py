@@ -1,10 +1,38 @@
 import django_filters
 
+from .consts import CARS_BRANDS, TRANSMISSION_OPTIONS
+from .facets import facet_counts
 from .models import Listing
+from .search import search_listings
 
 class ListingFilter(django_filters.FilterSet):
+    q = django_filters.CharFilter(method='filter_search', label='Search')
     
     class Meta:
         model=Listing
         fields = {'brand':{'exact'},'transmission': {'exact'},'model':{'icontains'}}
-    
\ No newline at end of file
+
+    def filter_search(self, queryset, name, value):
+        return search_listings(queryset, value)
+
+    @property
+    def ordering(self):
+        """Keyset ordering for ``qs``, most relevant first while searching."""
+        if self.is_bound and self.form.is_valid() and self.form.cleaned_data.get('q'):
+            return ('-rank', '-created_at', '-id')
+        return ('-created_at', '-id')
+
+    def add_facet_counts(self, counts=None):
+        """Show how many listings each brand/transmission option matches.
+
+        Must run before ``form`` or ``qs`` are first used, since the filter
+        fields are built from these choices. Async callers pass ``counts``
+        from ``afacet_counts``.
+        """
+        data = self.data or {}
+        if counts is None:
+            counts = facet_counts(data.get('brand'), data.get('transmission'))
+        for name, options in (('brand', CARS_BRANDS), ('transmission', TRANSMISSION_OPTIONS)):
+            self.filters[name].extra['choices'] = [
+                (value, f'{label} ({counts[name].get(value, 0)})') for value, label in options]
+        return counts
@@ -1,10 +1,57 @@
 from django import forms
 
-from .models import Listing
+from .images import LISTING_VARIANTS, ImageVariantsFormMixin
+from .models import Listing, SavedSearch
+from .uploads import verify_listing_upload
 
-class ListingForm(forms.ModelForm):
-    image = forms.ImageField()
+class ListingForm(ImageVariantsFormMixin, forms.ModelForm):
+    image_variants = {'image': LISTING_VARIANTS}
+    image = forms.ImageField(required=False)
+    # key of an image the browser already uploaded straight to storage
+    image_key = forms.CharField(required=False, widget=forms.HiddenInput)
     class Meta:
         model =Listing 
         fields = {'brand','model','vin','mileage','color',
-                  'description','engine','transmission','image'}
\ No newline at end of file
+                  'description','engine','transmission','image'}
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
+    def clean_image_key(self):
+        key = self.cleaned_data.get('image_key')
+        if key:
+            if self.user is None:
+                raise forms.ValidationError('Direct uploads need a signed in user.')
+            verify_listing_upload(self.user, key)
+        return key
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (not cleaned_data.get('image') and not cleaned_data.get('image_key')
+                and not self.instance.image):
+            self.add_error('image', 'This field is required.')
+        return cleaned_data
+
+    def _post_clean(self):
+        # attach the verified key before the model fields are validated
+        if self.cleaned_data.get('image_key') and not self.cleaned_data.get('image'):
+            self.instance.image = self.cleaned_data['image_key']
+        super()._post_clean()
+
+    def image_changed(self, field):
+        return super().image_changed(field) or (
+            field == 'image' and bool(self.cleaned_data.get('image_key')))
+
+
+class SavedSearchForm(forms.ModelForm):
+
+    class Meta:
+        model = SavedSearch
+        fields = ('brand', 'transmission', 'model')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(field) for field in self.Meta.fields):
+            raise forms.ValidationError('Pick at least one filter to save.')
+        return cleaned_data
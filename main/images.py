@@ -0,0 +1,87 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# name: (width, height, crop). Cropped variants fill the box exactly,
+# the others keep the original aspect ratio within it.
+VARIANTS = {
+    'thumb': (320, 240, False),
+    'card': (640, 480, False),
+    'hero': (1920, 1080, False),
+    'avatar': (64, 64, True),
+}
+LISTING_VARIANTS = ('thumb', 'card', 'hero')
+PROFILE_VARIANTS = ('avatar',)
+
+FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(name, variant, fmt):
+    """``user_2/listings/car.jpeg`` -> ``user_2/listings/car.card.webp``."""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{variant}.{FORMATS[fmt][0]}'
+
+
+def _resize(image, variant):
+    width, height, crop = VARIANTS[variant]
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.LANCZOS)
+    return resized
+
+
+def generate_variants(storage, name, variants):
+    """Write every variant/format of image ``name`` next to it in ``storage``."""
+    with storage.open(name, 'rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image = image.convert('RGB')
+
+    written = []
+    for variant in variants:
+        resized = _resize(image, variant)
+        for fmt, (_, pil_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            target = variant_name(name, variant, fmt)
+            # delete first so backends that never overwrite keep the predictable name
+            storage.delete(target)
+            written.append(storage.save(target, ContentFile(buffer.getvalue())))
+    return written
+
+
+def missing_variants(storage, name, variants):
+    """The ``variants`` of image ``name`` that lack a format in ``storage``."""
+    return [variant for variant in variants
+            if not all(storage.exists(variant_name(name, variant, fmt)) for fmt in FORMATS)]
+
+
+class ImageVariantsFormMixin:
+    """Generate variants for newly uploaded images once the instance is saved.
+
+    ``image_variants`` maps an image field name to the variants it needs.
+    Forms saved with ``commit=False`` must call ``save_m2m()`` afterwards, as
+    Django already expects.
+    """
+
+    image_variants = {}
+
+    def image_changed(self, field):
+        return field in self.changed_data
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        for field, variants in self.image_variants.items():
+            fieldfile = getattr(self.instance, field)
+            if not (self.image_changed(field) and fieldfile):
+                continue
+            if getattr(fieldfile, 'blob_reused', False):
+                # a reused blob has the variants of the field that stored it first
+                variants = missing_variants(fieldfile.storage, fieldfile.name, variants)
+            if variants:
+                generate_variants(fieldfile.storage, fieldfile.name, variants)
@@ -0,0 +1,133 @@
+import csv
+import json
+import os
+from collections import Counter
+from itertools import islice
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from users.forms import LocationForm
+from users.models import Location
+from .blobs import claim_blob, upload_blob
+from .facets import adjust_facets
+from .forms import ListingForm
+from .images import LISTING_VARIANTS, generate_variants, missing_variants
+from .models import Listing
+from .saved_searches import match_listings
+from .similar import index_listings
+
+
+class InventoryListingForm(ListingForm):
+    """ListingForm's rules without the upload, feed rows name their image instead."""
+
+    image = None
+    image_key = None
+
+    class Meta(ListingForm.Meta):
+        fields = ListingForm.Meta.fields - {'image'}
+
+    def clean(self):
+        return self.cleaned_data
+
+
+def read_rows(path):
+    """Yield ``(line_number, row)`` from a CSV or JSON Lines file, one row at a time."""
+    with open(path, newline='', encoding='utf-8') as feed:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for number, line in enumerate(feed, start=1):
+                if line.strip():
+                    yield number, json.loads(line)
+        else:
+            # line 1 is the header
+            for number, row in enumerate(csv.DictReader(feed), start=2):
+                yield number, row
+
+
+def validate_rows(rows, seller):
+    """Yield ``(line_number, listing, location, image_source, errors)`` per row."""
+    for number, row in rows:
+        listing_form = InventoryListingForm(row)
+        location_form = LocationForm(row)
+        if not (listing_form.is_valid() and location_form.is_valid()):
+            yield number, None, None, None, {**listing_form.errors, **location_form.errors}
+            continue
+        image = (row.get('image') or '').strip()
+        if not image:
+            yield number, None, None, None, {'image': ['This field is required.']}
+            continue
+        listing = listing_form.save(commit=False)
+        listing.seller = seller
+        yield number, listing, location_form.save(commit=False), image, None
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def fetch_image(source, image_root=None):
+    """Read image bytes from an http(s) URL or a path below ``image_root``."""
+    if urlparse(source).scheme in ('http', 'https'):
+        with urlopen(source, timeout=30) as response:
+            return response.read()
+    path = os.path.join(image_root or '', source)
+    with open(path, 'rb') as image:
+        return image.read()
+
+
+def store_image(listing, source, image_root=None):
+    """Upload one image unless its content is already stored, with its variants.
+
+    See ``main.blobs``; a reused blob only gets the variants it is missing.
+    """
+    filename = os.path.basename(urlparse(source).path) or 'image.jpg'
+    name, size, uploaded = upload_blob(default_storage,
+                                       ContentFile(fetch_image(source, image_root)), filename)
+    variants = LISTING_VARIANTS if uploaded else missing_variants(
+        default_storage, name, LISTING_VARIANTS)
+    if variants:
+        generate_variants(default_storage, name, variants)
+    listing.image = name
+    return name, size, uploaded
+
+
+def import_batch(batch, pool, image_root=None):
+    """Store images in parallel, then insert the batch's locations and listings.
+
+    Returns how many listings were created and the ``(line_number, errors)``
+    of the rows rejected in this batch.
+    """
+    rejects = [(number, errors) for number, _, _, _, errors in batch if errors]
+    valid = [item for item in batch if not item[4]]
+
+    futures = [pool.submit(store_image, listing, image, image_root)
+               for _, listing, _, image, _ in valid]
+    ready, blobs = [], []
+    for item, future in zip(valid, futures):
+        try:
+            blobs.append(future.result())
+        except Exception as e:
+            rejects.append((item[0], {'image': [str(e)]}))
+        else:
+            ready.append(item)
+
+    with transaction.atomic():
+        # the uploads ran in the pool, their references are taken here
+        for blob in blobs:
+            claim_blob(*blob)
+        locations = Location.objects.bulk_create([location for _, _, location, _, _ in ready])
+        listings = []
+        for (_, listing, _, _, _), location in zip(ready, locations):
+            listing.location = location
+            listings.append(listing)
+        Listing.objects.bulk_create(listings)
+        # bulk_create skips the post_save receivers that maintain the facets
+        adjust_facets(Counter((l.brand, l.transmission) for l in listings))
+        match_listings(listings)
+    index_listings(listings)
+    return len(listings), rejects
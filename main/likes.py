@@ -0,0 +1,39 @@
+"""Watchlisted listings.
+
+``Listing.like_count`` mirrors the number of ``LikedListing`` rows. It is
+only changed by ``F()`` updates in the same transaction as the row insert
+or delete, so concurrent likes never lose an increment and a repeated
+request changes nothing.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import LikedListing, Listing
+
+
+def liked_listing_ids(user, listing_ids):
+    """The subset of ``listing_ids`` that ``user`` has liked, in one query."""
+    listing_ids = list(listing_ids)
+    if not user.is_authenticated or not listing_ids:
+        return set()
+    return set(LikedListing.objects.filter(
+        profile__user=user, listing_id__in=listing_ids).values_list('listing_id', flat=True))
+
+
+def set_liked(profile, listing, liked):
+    """Make ``profile``'s like of ``listing`` match ``liked`` and return the like count."""
+    with transaction.atomic():
+        if liked:
+            try:
+                # the savepoint keeps the outer transaction usable after a duplicate
+                with transaction.atomic():
+                    LikedListing.objects.create(profile=profile, listing=listing)
+                changed = 1
+            except IntegrityError:
+                changed = 0
+        else:
+            deleted, _ = LikedListing.objects.filter(profile=profile, listing=listing).delete()
+            changed = -deleted
+        if changed:
+            Listing.objects.filter(pk=listing.pk).update(like_count=F('like_count') + changed)
+    return Listing.objects.filter(pk=listing.pk).values_list('like_count', flat=True).get()
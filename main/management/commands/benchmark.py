@@ -0,0 +1,80 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from main.benchmark import VIEWS, compare, run_benchmarks, seed
+
+# served from memory so no request leaves the machine
+BENCHMARK_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database with synthetic listings and report latency, '
+            'queries and bytes per view as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--listings', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed for the synthetic data.')
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per view.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per view.')
+        parser.add_argument('--views', nargs='+', choices=sorted(VIEWS), default=None)
+        parser.add_argument('--clear-cache', action='store_true',
+                            help='Clear the cache before every timed request.')
+        parser.add_argument('--output', default=None, help='Also write the JSON report here.')
+        parser.add_argument('--baseline', default=None,
+                            help='Report from an earlier run; fail if a view regressed.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p95 and size growth against the baseline (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as saved:
+                baseline = json.load(saved)['views']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # replicas would not see the test database, keep every read on it
+            with override_settings(STORAGES=BENCHMARK_STORAGES, DATABASE_REPLICAS=[]):
+                data = seed(options['users'], options['listings'], options['seed'])
+                results = run_benchmarks(data, options['views'], options['requests'],
+                                         options['warmup'], options['clear_cache'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'users': options['users'],
+                'listings': options['listings'],
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'views': results,
+        }
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as saved:
+                saved.write(output + '\n')
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,99 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from main.benchmark import percentile, seed
+
+from .benchmark import BENCHMARK_STORAGES
+
+
+def fetch(client, url):
+    """``(seconds to the first chunk, seconds to the last, bytes)`` of one GET."""
+    started = time.perf_counter()
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+    if not response.streaming:
+        # a rendered page is complete before its first byte can be sent
+        elapsed = time.perf_counter() - started
+        return elapsed, elapsed, len(response.content)
+    size, first = 0, None
+    for chunk in response.streaming_content:
+        first = first or time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    return first, time.perf_counter() - started, size
+
+
+def peak_memory(client, url):
+    """Peak bytes allocated by Python while serving one GET."""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        fetch(client, url)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def measure(client, url, requests):
+    fetch(client, url)
+    ttfb, total = [], []
+    for _ in range(requests):
+        first, last, size = fetch(client, url)
+        ttfb.append(first * 1000)
+        total.append(last * 1000)
+    return {
+        'ttfb_p50_ms': round(percentile(ttfb, 50), 3),
+        'ttfb_p95_ms': round(percentile(ttfb, 95), 3),
+        'total_mean_ms': round(statistics.fmean(total), 3),
+        'peak_kib': round(peak_memory(client, url) / 1024, 1),
+        'bytes': size,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare time to first byte and peak memory of the rendered and streamed '
+            'home page on a throwaway database, as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=2000)
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[24, 240, 1000])
+        parser.add_argument('--chunk-size', type=int, default=12)
+        parser.add_argument('--requests', type=int, default=10, help='Timed requests per case.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(STORAGES=BENCHMARK_STORAGES, DATABASE_REPLICAS=[]):
+                data = seed(listings=options['listings'], seed=options['seed'])
+                client = Client()
+                client.force_login(User.objects.get(username=data['username']))
+                results = {}
+                for page_size in options['page_sizes']:
+                    results[page_size] = {}
+                    for mode, streaming in (('render', False), ('stream', True)):
+                        with override_settings(HOME_STREAMING=streaming,
+                                               LISTINGS_PAGE_SIZE=page_size,
+                                               HOME_STREAM_PAGE_SIZE=page_size,
+                                               HOME_STREAM_CHUNK_SIZE=options['chunk_size']):
+                            results[page_size][mode] = measure(client, reverse('home'),
+                                                               options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps({
+            'meta': {key: options[key] for key in ('listings', 'chunk_size', 'requests', 'seed')},
+            'page_sizes': results,
+        }, indent=2))
@@ -0,0 +1,76 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.benchmark import percentile
+from main.consts import CARS_BRANDS, TRANSMISSION_OPTIONS
+from main.saved_searches import SearchIndex
+
+MODELS = ('golf', 'civic', 'corolla', 'focus', 'a4', 'm3', 'model 3', 'cayenne',
+          'discovery', 'impreza', 'camaro', 'huracan', 'continental', 'xf', 'c-class')
+
+
+def synthetic_searches(count, rng):
+    brands = [''] + [brand for brand, _ in CARS_BRANDS]
+    transmissions = [''] + [option for option, _ in TRANSMISSION_OPTIONS]
+    for search_id in range(count):
+        yield (search_id, rng.randrange(count // 3 + 1), rng.choice(brands),
+               rng.choice(transmissions), rng.choice(('',) + MODELS))
+
+
+def naive_match(searches, brand, transmission, model):
+    """What re-running every saved query would do, one search at a time."""
+    model = model.lower()
+    return [search_id for search_id, _, s_brand, s_transmission, s_model in searches
+            if s_brand in ('', brand) and s_transmission in ('', transmission)
+            and s_model in model]
+
+
+class Command(BaseCommand):
+    help = 'Time matching new listings against many synthetic saved searches (no database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--searches', type=int, default=100000)
+        parser.add_argument('--listings', type=int, default=2000)
+        parser.add_argument('--naive-sample', type=int, default=50,
+                            help='Listings also matched by scanning every search, for comparison.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        searches = list(synthetic_searches(options['searches'], rng))
+        started = time.perf_counter()
+        index = SearchIndex(searches)
+        build_seconds = time.perf_counter() - started
+
+        listings = [(rng.choice(CARS_BRANDS)[0], rng.choice(TRANSMISSION_OPTIONS)[0],
+                     f'{rng.choice(MODELS)} {rng.randrange(100)}')
+                    for _ in range(options['listings'])]
+        timings, matched = [], 0
+        for brand, transmission, model in listings:
+            started = time.perf_counter()
+            matched += len(index.match(brand, transmission, model))
+            timings.append((time.perf_counter() - started) * 1000)
+
+        naive = []
+        for brand, transmission, model in listings[:options['naive_sample']]:
+            started = time.perf_counter()
+            expected = naive_match(searches, brand, transmission, model)
+            naive.append((time.perf_counter() - started) * 1000)
+            assert sorted(expected) == sorted(index.match(brand, transmission, model))
+
+        report = {
+            'saved_searches': options['searches'],
+            'listings': options['listings'],
+            'build_seconds': round(build_seconds, 3),
+            'matches_per_listing': round(matched / len(listings), 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'listings_per_second': round(len(listings) / (sum(timings) / 1000)),
+        }
+        if naive:
+            report['naive_p50_ms'] = round(percentile(naive, 50), 3)
+            report['speedup'] = round(percentile(naive, 50) / max(report['p50_ms'], 1e-6), 1)
+        self.stdout.write(json.dumps(report, indent=2))
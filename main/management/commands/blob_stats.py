@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main.blobs import blob_stats
+
+
+class Command(BaseCommand):
+    help = 'Show how many content-addressed images are stored and the bytes dedupe saved.'
+
+    def handle(self, *args, **options):
+        stats = blob_stats()
+        self.stdout.write(
+            f"blobs={stats['blobs']} references={stats['references']} "
+            f"stored_bytes={stats['stored_bytes']}")
+        self.stdout.write(
+            f"reused_uploads={stats['reused_uploads']} "
+            f"upload_bytes_saved={stats['upload_bytes_saved']} "
+            f"storage_bytes_saved={stats['storage_bytes_saved']}")
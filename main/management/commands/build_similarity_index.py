@@ -0,0 +1,82 @@
+import json
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.benchmark import percentile
+from main.similar import FEATURES, OFFSETS, WIDTH, SimilarityIndex, build_index
+
+
+def synthetic_matrix(count, rng):
+    """Feature rows shaped like real ones: one value per categorical block."""
+    matrix = np.zeros((count, WIDTH), dtype=np.float32)
+    rows = np.arange(count)
+    for name, (vocabulary, weight) in FEATURES.items():
+        start, size = OFFSETS[name]
+        if vocabulary:
+            matrix[rows, start + rng.integers(0, size, count)] = np.sqrt(weight)
+        else:
+            matrix[:, start] = rng.random(count) * np.sqrt(weight)
+    return matrix
+
+
+class Command(BaseCommand):
+    help = ('Build the similar-listings index from the database and save it for the '
+            'web workers, or measure query latency and memory on synthetic listings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='Where to save the index (default: SIMILAR_INDEX_PATH).')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Benchmark an index of this many random listings instead.')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Nearest-neighbour queries timed in the benchmark.')
+        parser.add_argument('--k', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            report = {'synthetic': self.benchmark(options)}
+        else:
+            report = self.build(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def build(self, options):
+        started = time.perf_counter()
+        index = build_index()
+        report = {
+            'listings': len(index),
+            'build_seconds': round(time.perf_counter() - started, 3),
+            'bytes': index.nbytes,
+        }
+        output = options['output'] or settings.SIMILAR_INDEX_PATH
+        if output:
+            index.save(output)
+            report['output'] = output
+        return report
+
+    def benchmark(self, options):
+        count, k = options['synthetic'], options['k'] or settings.SIMILAR_LISTINGS_COUNT
+        rng = np.random.default_rng(0)
+        matrix = synthetic_matrix(count, rng)
+        started = time.perf_counter()
+        index = SimilarityIndex([uuid.UUID(int=n) for n in range(count)], matrix)
+        build_seconds = time.perf_counter() - started
+
+        timings = []
+        for row in rng.integers(0, count, options['queries']):
+            started = time.perf_counter()
+            index.nearest(matrix[row], k, exclude=uuid.UUID(int=int(row)))
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'listings': count,
+            'features': WIDTH,
+            'k': k,
+            'build_seconds': round(build_seconds, 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'bytes': index.nbytes,
+            'bytes_per_100k': round(index.nbytes * 100000 / count),
+        }
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main.caching import card_cache_stats, reset_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit/miss ratio of the listing card fragment cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Zero the counters after printing them.')
+
+    def handle(self, *args, **options):
+        stats = card_cache_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} "
+            f"hit_ratio={stats['hit_ratio']:.2%}")
+        if options['reset']:
+            reset_card_cache_stats()
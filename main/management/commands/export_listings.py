@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from main.exports import EXPORT_FORMATS, export_lines
+from main.filters import ListingFilter
+from main.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Stream listings, optionally filtered like the home page, as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help="File to write, '-' for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--brand')
+        parser.add_argument('--transmission')
+        parser.add_argument('--model', help='Case-insensitive substring of the model.')
+        parser.add_argument('--q', help='Full-text search, as the q filter.')
+
+    def handle(self, *args, **options):
+        data = {'brand': options['brand'], 'transmission': options['transmission'],
+                'model__icontains': options['model'], 'q': options['q']}
+        listing_filter = ListingFilter({k: v for k, v in data.items() if v},
+                                       queryset=Listing.objects.all())
+        if not listing_filter.is_valid():
+            self.stderr.write(str(listing_filter.errors))
+            return
+        lines = export_lines(listing_filter.qs, options['format'], options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
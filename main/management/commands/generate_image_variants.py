@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main.images import LISTING_VARIANTS, PROFILE_VARIANTS, generate_variants, variant_name
+from main.models import Listing
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail/card/hero/avatar variants for existing listing and profile images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of images processed in parallel.')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate variants that already exist.')
+
+    def _jobs(self):
+        names = Listing.objects.exclude(image='').values_list('image', flat=True)
+        for name in names.iterator():
+            yield name, LISTING_VARIANTS
+        names = Profile.objects.exclude(photo='').exclude(photo=None).values_list('photo', flat=True)
+        for name in names.iterator():
+            yield name, PROFILE_VARIANTS
+
+    def _process(self, name, variants, force):
+        if not force and default_storage.exists(variant_name(name, variants[-1], 'jpeg')):
+            return False
+        generate_variants(default_storage, name, variants)
+        return True
+
+    def handle(self, *args, **options):
+        generated = skipped = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(self._process, name, variants, options['force']): name
+                for name, variants in self._jobs()
+            }
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        generated += 1
+                    else:
+                        skipped += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Variants generated for {generated} images, '
+            f'{skipped} already done, {failed} failed.'))
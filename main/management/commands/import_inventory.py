@@ -0,0 +1,70 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import dropwhile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main.inventory import batched, import_batch, read_rows, validate_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a dealer CSV/JSONL inventory feed into listings in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or .jsonl feed, one car per row.')
+        parser.add_argument('--seller', required=True, help='Username the listings belong to.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--image-workers', type=int, default=8,
+                            help='Images fetched and stored in parallel per batch.')
+        parser.add_argument('--image-root', default=None,
+                            help='Directory relative image paths are resolved against.')
+        parser.add_argument('--checkpoint', default=None,
+                            help='File recording the last imported line (default: <path>.checkpoint).')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip rows up to the line stored in the checkpoint file.')
+        parser.add_argument('--rejects', default=None,
+                            help='Write rejected rows and their errors here as JSON Lines.')
+
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.select_related('profile').get(
+                username=options['seller']).profile
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['seller']}")
+
+        checkpoint = options['checkpoint'] or f"{options['path']}.checkpoint"
+        start_after = 0
+        if options['resume']:
+            try:
+                with open(checkpoint) as saved:
+                    start_after = int(saved.read().strip() or 0)
+            except FileNotFoundError:
+                pass
+
+        rows = dropwhile(lambda item: item[0] <= start_after, read_rows(options['path']))
+        rejects_file = open(options['rejects'], 'a') if options['rejects'] else None
+        imported = rejected = 0
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=options['image_workers']) as pool:
+                for batch in batched(validate_rows(rows, seller), options['batch_size']):
+                    created, rejects = import_batch(batch, pool, options['image_root'])
+                    imported += created
+                    rejected += len(rejects)
+                    if rejects_file:
+                        for number, errors in rejects:
+                            rejects_file.write(json.dumps({'line': number, 'errors': errors}) + '\n')
+                    with open(checkpoint, 'w') as saved:
+                        saved.write(str(batch[-1][0]))
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f'line {batch[-1][0]}: imported={imported} rejected={rejected} '
+                        f'rate={(imported + rejected) / elapsed:.1f} rows/s')
+        finally:
+            if rejects_file:
+                rejects_file.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} listings, rejected {rejected} rows. '
+            f'Checkpoint: {checkpoint}'))
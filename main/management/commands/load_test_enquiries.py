@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import include, path, reverse
+
+from main import async_views, aws
+from main.benchmark import BENCHMARK_PREFIX, percentile, seed
+from main.management.commands.benchmark import BENCHMARK_STORAGES
+from main.models import OutboxMessage
+from main.sns_email import LocalPublisher
+
+# ROOT_URLCONF of the ASGI run: the async views shadow the sync ones
+urlpatterns = [
+    path('listing/<str:id>/enquire/', async_views.enquire_listing_by_email,
+         name='enquire_listing'),
+    path('', include('automotive.urls')),
+]
+
+
+def summary(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare enquiry throughput of the sync view on a threaded WSGI-style worker '
+            'with the async view on one event loop, against a slow stubbed SNS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--sns-delay', type=float, default=0.2,
+                            help='Seconds each stubbed SNS publish takes.')
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help='Worker threads of the WSGI run, e.g. gunicorn --threads.')
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help='Requests in flight at once in the ASGI run.')
+        parser.add_argument('--pool-size', type=int, default=32,
+                            help='AWS_THREAD_POOL_SIZE for the ASGI run.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        test_db = None
+        if connection.vendor == 'sqlite':
+            # a file, so the WSGI threads get their own connections to the same data
+            handle, test_db = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(handle)
+            connection.settings_dict['TEST']['NAME'] = test_db
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        LocalPublisher.delay = options['sns_delay']
+        try:
+            with override_settings(STORAGES=BENCHMARK_STORAGES, DATABASE_REPLICAS=[],
+                                   NOTIFICATION_PUBLISHER='main.sns_email.LocalPublisher',
+                                   OUTBOX_IMMEDIATE_DISPATCH=True, SERVER_TIMING_SAMPLE_RATE=0):
+                data = seed(users=2, listings=10)
+                buyer = User.objects.get(username=f'{BENCHMARK_PREFIX}1')
+                url = reverse('enquire_listing', kwargs={'id': data['listing_id']})
+                report = {'wsgi': self.run_wsgi(url, buyer, options)}
+                with override_settings(ROOT_URLCONF=__name__,
+                                       AWS_THREAD_POOL_SIZE=options['pool_size']):
+                    aws.reset()
+                    report['asgi'] = asyncio.run(self.run_asgi(url, buyer, options))
+                report['sent'] = OutboxMessage.objects.filter(status=OutboxMessage.SENT).count()
+        finally:
+            LocalPublisher.delay = 0
+            aws.reset()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if test_db and os.path.exists(test_db):
+                os.remove(test_db)
+
+        report['speedup'] = round(
+            report['asgi']['throughput_rps'] / report['wsgi']['throughput_rps'], 2)
+        report['settings'] = {key: options[key] for key in
+                              ('requests', 'sns_delay', 'wsgi_threads', 'concurrency', 'pool_size')}
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_wsgi(self, url, buyer, options):
+        local = threading.local()
+
+        def post(_):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+                client.force_login(buyer)
+            started = time.perf_counter()
+            response = client.post(url)
+            assert response.status_code == 202, response.status_code
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as pool:
+            latencies = list(pool.map(post, range(options['requests'])))
+        return summary(latencies, time.perf_counter() - started)
+
+    async def run_asgi(self, url, buyer, options):
+        client = AsyncClient()
+        await client.aforce_login(buyer)
+        in_flight = asyncio.Semaphore(options['concurrency'])
+
+        async def post():
+            async with in_flight:
+                started = time.perf_counter()
+                response = await client.post(url)
+                assert response.status_code == 202, response.status_code
+                return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(post() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        # let publishes that outlived their response finish before the loop closes
+        await asyncio.gather(*async_views._background)
+        return summary(latencies, elapsed)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = 'Recount the brand x transmission facet table from the listings.'
+
+    def handle(self, *args, **options):
+        pairs = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {pairs} facet counts.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.saved_searches import queue_digests
+
+
+class Command(BaseCommand):
+    help = ('Queue one digest email per buyer with new saved search matches; '
+            'drain_outbox publishes them through SNS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Matches handled per run (default: SAVED_SEARCH_DIGEST_LIMIT).')
+
+    def handle(self, *args, **options):
+        queued = queue_digests(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} digests.'))
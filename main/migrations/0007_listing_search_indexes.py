@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models.functions import Upper
+
+# GIN indexes only exist on PostgreSQL, other backends use the icontains
+# fallback in main.search and skip this migration's work.
+
+
+def _search_indexes():
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+
+    from main.search import search_vector
+
+    return [
+        GinIndex(search_vector(), name='listing_search_fts_idx'),
+        # matches the UPPER(model::text) LIKE expression icontains compiles to
+        GinIndex(OpClass(Upper('model'), name='gin_trgm_ops'),
+                 name='listing_model_trgm_idx'),
+    ]
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Listing = apps.get_model('main', 'Listing')
+    for index in _search_indexes():
+        schema_editor.add_index(Listing, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Listing = apps.get_model('main', 'Listing')
+    for index in _search_indexes():
+        schema_editor.remove_index(Listing, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_listing_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:46
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_listings(apps, schema_editor):
+    Listing = apps.get_model('main', 'Listing')
+    ListingFacet = apps.get_model('main', 'ListingFacet')
+    rows = (Listing.objects.order_by().values('brand', 'transmission')
+            .annotate(count=Count('id')))
+    ListingFacet.objects.bulk_create(ListingFacet(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(choices=[('bmw', 'BMW'), ('mercedes benz', 'Mercedes Benz'), ('ford', 'Ford'), ('audi', 'Audi'), ('subaru', 'Subaru'), ('tesla', 'Tesla'), ('jaguar', 'Jaguar'), ('land rover', 'Land Rover'), ('bentley', 'Bentley'), ('bugatti', 'Bugatti'), ('ferrari', 'Ferrari'), ('lamborghini', 'Lamborghini'), ('honda', 'Honda'), ('toyota', 'Toyota'), ('chevrolet', 'Chevrolet'), ('porsche', 'Porsche')], max_length=25)),
+                ('transmission', models.CharField(choices=[('automatic', 'Automatic'), ('manual', 'Manual')], max_length=24)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('brand', 'transmission'), name='unique_listing_facet')],
+            },
+        ),
+        migrations.RunPython(count_existing_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_listingfacet'),
+        ('users', '0007_alter_location_state_alter_location_zip_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('brand', models.CharField(blank=True, choices=[('bmw', 'BMW'), ('mercedes benz', 'Mercedes Benz'), ('ford', 'Ford'), ('audi', 'Audi'), ('subaru', 'Subaru'), ('tesla', 'Tesla'), ('jaguar', 'Jaguar'), ('land rover', 'Land Rover'), ('bentley', 'Bentley'), ('bugatti', 'Bugatti'), ('ferrari', 'Ferrari'), ('lamborghini', 'Lamborghini'), ('honda', 'Honda'), ('toyota', 'Toyota'), ('chevrolet', 'Chevrolet'), ('porsche', 'Porsche')], max_length=25)),
+                ('transmission', models.CharField(blank=True, choices=[('automatic', 'Automatic'), ('manual', 'Manual')], max_length=24)),
+                ('model', models.CharField(blank=True, max_length=64)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to='users.profile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavedSearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_search_matches', to='main.listing')),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='main.savedsearch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['notified_at'], name='saved_match_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('saved_search', 'listing'), name='unique_saved_search_match')],
+            },
+        ),
+    ]
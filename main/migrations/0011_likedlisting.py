@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_savedsearch'),
+        ('users', '0007_alter_location_state_alter_location_zip_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LikedListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('like_date', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='main.listing')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liked_listings', to='users.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'listing'), name='unique_liked_listing')],
+            },
+        ),
+    ]
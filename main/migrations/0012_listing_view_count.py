@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_likedlisting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:16
+
+import main.fields
+import main.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_listing_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('reuse_count', models.PositiveIntegerField(default=0)),
+                ('bytes_saved', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='image',
+            field=main.fields.ContentAddressedImageField(upload_to=main.utils.user_listing_path),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 from users.models import Profile,Location
 from .consts import CARS_BRANDS,TRANSMISSION_OPTIONS
+from .fields import ContentAddressedImageField
 from .utils import user_listing_path
 
 class Listing(models.Model):
@@ -23,11 +26,148 @@ class Listing(models.Model):
         max_length=24,choices=TRANSMISSION_OPTIONS,default=None)
     location = models.OneToOneField(
         Location,on_delete=models.SET_NULL,null=True)
-    image = models.ImageField(upload_to=user_listing_path)
+    image = ContentAddressedImageField(upload_to=user_listing_path)
+    # denormalized count of LikedListing rows, only ever changed with F() updates
+    like_count = models.PositiveIntegerField(default=0)
+    # written behind by main.view_counts, so it can trail the real count by a few seconds
+    view_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['brand', '-created_at', '-id'],
+                         name='listing_brand_created_idx'),
+            models.Index(fields=['transmission', '-created_at', '-id'],
+                         name='listing_trans_created_idx'),
+            models.Index(fields=['-created_at', '-id'],
+                         name='listing_created_idx'),
+        ]
     
     
+    # only changed with F() updates; a plain save() must not write back a stale copy
+    COUNTER_FIELDS = ('like_count', 'view_count')
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # only the UPDATE skips the counters, inserts and explicit update_fields write them
+        if update_fields is None:
+            values = [value for value in values if value[0].name not in self.COUNTER_FIELDS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
     def __str__(self):
         return f'{self.seller.user.username}\'s Listing - {self.model}'
 
 
         
+
+
+class LikedListing(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='liked_listings')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='likes')
+    like_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'listing'], name='unique_liked_listing'),
+        ]
+
+    def __str__(self):
+        return f'{self.listing.model} liked by {self.profile.user.username}'
+
+
+class StoredBlob(models.Model):
+    """One content-addressed image file and how many images point at it."""
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # uploads skipped because the same bytes were already stored
+    reuse_count = models.PositiveIntegerField(default=0)
+    bytes_saved = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} references)'
+
+
+class OutboxMessage(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # SNS rejects subjects longer than 100 characters
+    subject = models.CharField(max_length=100)
+    message = models.TextField()
+    listing = models.ForeignKey(
+        Listing, on_delete=models.SET_NULL, null=True, related_name='outbox_messages')
+    sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_status_display()} message - {self.subject}'
+
+
+class ListingFacet(models.Model):
+    """Number of listings per brand and transmission, kept up to date by signals."""
+
+    brand = models.CharField(max_length=25, choices=CARS_BRANDS)
+    transmission = models.CharField(max_length=24, choices=TRANSMISSION_OPTIONS)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['brand', 'transmission'],
+                                    name='unique_listing_facet'),
+        ]
+
+    def __str__(self):
+        return f'{self.brand} {self.transmission}: {self.count}'
+
+
+class SavedSearch(models.Model):
+    """Filters a buyer wants to hear about; empty fields match anything."""
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='saved_searches')
+    brand = models.CharField(max_length=25, choices=CARS_BRANDS, blank=True)
+    transmission = models.CharField(max_length=24, choices=TRANSMISSION_OPTIONS, blank=True)
+    # case-insensitive substring, like the model filter on the home page
+    model = models.CharField(max_length=64, blank=True)
+
+    def __str__(self):
+        terms = [self.get_brand_display(), self.get_transmission_display(), self.model]
+        return ' '.join(term for term in terms if term) or 'Any listing'
+
+
+class SavedSearchMatch(models.Model):
+    """A new listing found for a saved search, waiting for the next digest."""
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='saved_search_matches')
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['saved_search', 'listing'],
+                                    name='unique_saved_search_match'),
+        ]
+        indexes = [
+            models.Index(fields=['notified_at'], name='saved_match_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.saved_search} - {self.listing_id}'
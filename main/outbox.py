@@ -0,0 +1,155 @@
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .aws import run_in_pool
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def _new_message(subject, message, listing, sender, hold):
+    fields = {}
+    if hold:
+        # the caller is publishing it now, keep the worker away meanwhile
+        fields['next_attempt_at'] = timezone.now() + timedelta(
+            seconds=settings.OUTBOX_DISPATCH_HOLD_SECONDS)
+    return OutboxMessage(subject=subject[:100], message=message, listing=listing,
+                         sender=sender, **fields)
+
+
+def enqueue(subject, message, listing=None, sender=None, hold=False):
+    """Store a notification for the outbox worker instead of sending it inline.
+
+    With ``hold`` the worker skips it for ``OUTBOX_DISPATCH_HOLD_SECONDS``,
+    for callers that go on to ``publish_now`` it themselves.
+    """
+    outbox_message = _new_message(subject, message, listing, sender, hold)
+    outbox_message.save()
+    return outbox_message
+
+
+async def aenqueue(subject, message, listing=None, sender=None, hold=False):
+    outbox_message = _new_message(subject, message, listing, sender, hold)
+    await outbox_message.asave()
+    return outbox_message
+
+
+def _pending(message):
+    return OutboxMessage.objects.filter(pk=message.pk, status=OutboxMessage.PENDING)
+
+
+def _sent_fields():
+    return {'status': OutboxMessage.SENT, 'sent_at': timezone.now(),
+            'attempts': F('attempts') + 1, 'last_error': ''}
+
+
+def publish_now(message, publisher=None):
+    """Best-effort immediate publish of a held message.
+
+    Returns whether it was sent; otherwise it stays pending and the worker
+    retries it once the hold expires.
+    """
+    publisher = publisher or get_publisher()
+    try:
+        failures = publisher.publish_batch([(message.pk, message.subject, message.message)])
+    except Exception:
+        logger.exception('Immediate publish of outbox message %s failed', message.pk)
+        return False
+    if failures:
+        return False
+    _pending(message).update(**_sent_fields())
+    return True
+
+
+async def apublish_now(message, publisher=None):
+    """Async ``publish_now``; the blocking publish runs on the AWS thread pool."""
+    publisher = publisher or get_publisher()
+    try:
+        failures = await run_in_pool(
+            publisher.publish_batch, [(message.pk, message.subject, message.message)])
+    except Exception:
+        logger.exception('Immediate publish of outbox message %s failed', message.pk)
+        return False
+    if failures:
+        return False
+    await _pending(message).aupdate(**_sent_fields())
+    return True
+
+
+@lru_cache(maxsize=None)
+def _load_publisher(path):
+    return import_string(path)()
+
+
+def get_publisher():
+    """The configured publisher, built once per process so its client is reused."""
+    return _load_publisher(settings.NOTIFICATION_PUBLISHER)
+
+
+def retry_delay(attempts):
+    delay = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOX_RETRY_MAX_SECONDS))
+
+
+def claim(batch_size):
+    """Lease one batch of due messages to this worker and return them.
+
+    The rows are locked with SKIP LOCKED where the database supports it,
+    only for as long as it takes to move their ``next_attempt_at`` past
+    ``OUTBOX_LEASE_SECONDS``, so other workers skip them while they are
+    published and pick them up again if this worker dies.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxMessage.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size])
+        OutboxMessage.objects.filter(pk__in=[m.pk for m in messages]).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+    return messages
+
+
+def drain(batch_size=None, publisher=None):
+    """Publish one batch of due messages and record the outcome.
+
+    Returns ``(sent, failed)`` counts for the batch. The batch is claimed and
+    its outcome recorded in two short transactions, so no row lock is held
+    while SNS is called. A publisher that raises fails the whole batch.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    publisher = publisher or get_publisher()
+    messages = claim(batch_size)
+    if not messages:
+        return 0, 0
+    try:
+        failures = publisher.publish_batch(
+            [(m.pk, m.subject, m.message) for m in messages])
+    except Exception as e:
+        logger.exception('Publishing %d outbox messages failed', len(messages))
+        failures = {m.pk: str(e) or type(e).__name__ for m in messages}
+
+    now = timezone.now()
+    with transaction.atomic():
+        for message in messages:
+            message.attempts += 1
+            if message.pk in failures:
+                message.last_error = failures[message.pk]
+                if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    message.status = OutboxMessage.FAILED
+                else:
+                    message.next_attempt_at = now + retry_delay(message.attempts)
+            else:
+                message.status = OutboxMessage.SENT
+                message.sent_at = now
+                message.last_error = ''
+        OutboxMessage.objects.bulk_update(
+            messages, ['attempts', 'status', 'sent_at', 'next_attempt_at', 'last_error'])
+    return len(messages) - len(failures), len(failures)
@@ -0,0 +1,189 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """One page of a keyset (cursor) paginated queryset."""
+
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [str(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering, fields=None):
+    """``(direction, values)`` of ``cursor``, each value converted by ``fields`` if given."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ('n', 'p') or len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    if fields is not None:
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(cursor)
+    return direction, values
+
+
+def _field_name(key):
+    return key.lstrip('-')
+
+
+def _ordering_fields(queryset, ordering):
+    """The model field or annotation output field behind each key of ``ordering``."""
+    fields = []
+    for key in ordering:
+        name = _field_name(key)
+        annotation = queryset.query.annotations.get(name)
+        fields.append(annotation.output_field if annotation is not None
+                      else queryset.model._meta.get_field(name))
+    return fields
+
+
+def _row_values(obj, ordering):
+    if isinstance(obj, dict):
+        return [obj[_field_name(key)] for key in ordering]
+    return [getattr(obj, _field_name(key)) for key in ordering]
+
+
+def _keyset_filter(ordering, values, forward):
+    """Build the row comparison ``(a, b, ...) > (x, y, ...)`` as nested ORs."""
+    condition = Q()
+    for position in reversed(range(len(ordering))):
+        key = ordering[position]
+        name = _field_name(key)
+        descending = key.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        if position < len(ordering) - 1:
+            step |= Q(**{name: values[position]}) & condition
+        condition = step
+    return condition
+
+
+def _reverse(ordering):
+    return tuple(key[1:] if key.startswith('-') else f'-{key}' for key in ordering)
+
+
+def _page_query(queryset, cursor, page_size, ordering):
+    direction = 'n'
+    if cursor:
+        direction, values = decode_cursor(cursor, ordering, _ordering_fields(queryset, ordering))
+        queryset = queryset.filter(_keyset_filter(ordering, values, direction == 'n'))
+    order = ordering if direction == 'n' else _reverse(ordering)
+    return direction, queryset.order_by(*order)[:page_size + 1]
+
+
+def _build_page(rows, cursor, direction, page_size, ordering):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'p':
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    has_next = has_more if direction == 'n' else True
+    has_prev = bool(cursor) if direction == 'n' else has_more
+    next_cursor = encode_cursor('n', _row_values(rows[-1], ordering)) if has_next else None
+    prev_cursor = encode_cursor('p', _row_values(rows[0], ordering)) if has_prev else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+def paginate(queryset, cursor=None, page_size=20, ordering=DEFAULT_ORDERING):
+    """Return a KeysetPage of ``queryset`` ordered by ``ordering``.
+
+    The last key of ``ordering`` must be unique so the order is total and
+    cursors stay stable while rows are inserted or deleted.
+    """
+    direction, query = _page_query(queryset, cursor, page_size, ordering)
+    return _build_page(list(query), cursor, direction, page_size, ordering)
+
+
+async def apaginate(queryset, cursor=None, page_size=20, ordering=DEFAULT_ORDERING):
+    """Async version of ``paginate`` using the async ORM."""
+    direction, query = _page_query(queryset, cursor, page_size, ordering)
+    rows = [row async for row in query]
+    return _build_page(rows, cursor, direction, page_size, ordering)
+
+
+class StreamedPage(KeysetPage):
+    """A keyset page read in chunks as the database cursor yields the rows.
+
+    ``chunks()`` yields lists of at most ``chunk_size`` rows; the cursors are
+    only known once it is exhausted. Pages reached through a previous cursor
+    are read backwards, so those are fetched whole before the first chunk.
+    """
+
+    def __init__(self, queryset, cursor=None, page_size=20, ordering=DEFAULT_ORDERING,
+                 chunk_size=50):
+        super().__init__([])
+        # decoded here so an invalid cursor fails before anything is sent
+        self.direction, self.query = _page_query(queryset, cursor, page_size, ordering)
+        self.cursor = cursor
+        self.page_size = page_size
+        self.ordering = ordering
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        if self.direction == 'p':
+            page = _build_page(list(self.query), self.cursor, self.direction,
+                               self.page_size, self.ordering)
+            self.next_cursor, self.prev_cursor = page.next_cursor, page.prev_cursor
+            rows = page.object_list
+            for start in range(0, len(rows), self.chunk_size):
+                yield rows[start:start + self.chunk_size]
+            return
+
+        first = last = None
+        count = 0
+        chunk = []
+        for row in self.query.iterator(chunk_size=self.chunk_size):
+            count += 1
+            if count > self.page_size:
+                # the extra row only tells us there is a next page
+                break
+            if first is None:
+                first = row
+            last = row
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        if last is not None:
+            if count > self.page_size:
+                self.next_cursor = encode_cursor('n', _row_values(last, self.ordering))
+            if self.cursor:
+                self.prev_cursor = encode_cursor('p', _row_values(first, self.ordering))
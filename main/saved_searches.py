@@ -0,0 +1,122 @@
+"""Match new listings against saved searches and send the matches as digests.
+
+Saved searches are held in an inverted index keyed by ``(brand,
+transmission)``, with ``''`` standing for "any". A listing can only match
+the four buckets for its own brand and transmission, so matching costs a
+few dict lookups plus a substring test per candidate instead of one query
+per saved search. Each process keeps its own index and rebuilds it when
+the ``saved_searches`` version in the cache moves, which every saved
+search save or delete does.
+"""
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_version, get_versions
+from .models import OutboxMessage, SavedSearch, SavedSearchMatch
+
+VERSION_KIND = 'saved_searches'
+VERSION_KEY = 'all'
+
+
+class SearchIndex:
+    """Saved searches bucketed by ``(brand, transmission)``."""
+
+    def __init__(self, searches=(), version=None):
+        self.version = version
+        self.buckets = defaultdict(list)
+        for search_id, profile_id, brand, transmission, model in searches:
+            self.buckets[(brand, transmission)].append(
+                (search_id, profile_id, model.strip().lower()))
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def match(self, brand, transmission, model, seller_id=None):
+        """Ids of the saved searches a listing with these fields satisfies."""
+        model = (model or '').lower()
+        matched = []
+        for key in ((brand, transmission), (brand, ''), ('', transmission), ('', '')):
+            for search_id, profile_id, term in self.buckets.get(key, ()):
+                # sellers are not alerted about their own listings
+                if profile_id != seller_id and term in model:
+                    matched.append(search_id)
+        return matched
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def invalidate():
+    bump_version(VERSION_KIND, VERSION_KEY)
+
+
+def get_index():
+    """This process's index, rebuilt if a saved search changed anywhere since it was built."""
+    global _index
+    version = get_versions(VERSION_KIND, {VERSION_KEY})[VERSION_KEY]
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = SearchIndex(
+                SavedSearch.objects.values_list(
+                    'id', 'profile_id', 'brand', 'transmission', 'model').iterator(),
+                version)
+        return _index
+
+
+def match_listings(listings):
+    """Record a match for every saved search each of ``listings`` satisfies."""
+    index = get_index()
+    matches = [
+        SavedSearchMatch(saved_search_id=search_id, listing_id=listing.pk)
+        for listing in listings
+        for search_id in index.match(listing.brand, listing.transmission, listing.model,
+                                     listing.seller_id)
+    ]
+    SavedSearchMatch.objects.bulk_create(
+        matches, batch_size=settings.SAVED_SEARCH_MATCH_BATCH_SIZE, ignore_conflicts=True)
+    return len(matches)
+
+
+def digest_message(user, matches):
+    lines = [f'Hello {user.username},', '',
+             f'{len(matches)} new listing(s) match your saved searches on AutoVerse:', '']
+    for match in matches:
+        listing = match.listing
+        lines.append(f'- {listing.get_brand_display()} {listing.model}, '
+                     f'{listing.mileage} km ({match.saved_search})')
+    lines += ['', 'Thank you for using AutoVerse!']
+    return '\n'.join(lines)
+
+
+def queue_digests(limit=None):
+    """Turn pending matches into one outbox message per buyer.
+
+    The outbox worker then publishes them through SNS in batches. Returns
+    how many digests were queued.
+    """
+    limit = limit or settings.SAVED_SEARCH_DIGEST_LIMIT
+    with transaction.atomic():
+        # lock the match rows only, not the users and listings they are joined to
+        pending = list(
+            SavedSearchMatch.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(notified_at__isnull=True)
+            .select_related('saved_search__profile__user', 'listing')
+            .order_by('saved_search__profile_id', 'created_at')[:limit])
+        by_profile = defaultdict(list)
+        for match in pending:
+            by_profile[match.saved_search.profile].append(match)
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(subject=f'{len(matches)} new listing(s) for your saved searches',
+                          message=digest_message(profile.user, matches), sender=profile.user)
+            for profile, matches in by_profile.items())
+        SavedSearchMatch.objects.filter(pk__in=[match.pk for match in pending]).update(
+            notified_at=timezone.now())
+    return len(by_profile)
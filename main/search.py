@@ -0,0 +1,57 @@
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+
+SEARCH_FIELDS = ('model', 'description', 'engine', 'color')
+
+SEARCH_WEIGHTS = {'model': 'A', 'engine': 'B', 'color': 'C', 'description': 'D'}
+# SearchRank's default weights, mirrored by the fallback so both backends rank alike
+FALLBACK_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+
+def search_vector():
+    """The tsvector expression the ``listing_search_fts_idx`` index is built on."""
+    from django.contrib.postgres.search import SearchVector
+
+    vector = None
+    for field in SEARCH_FIELDS:
+        part = SearchVector(field, weight=SEARCH_WEIGHTS[field], config='english')
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def _postgres_search(queryset, query):
+    from django.contrib.postgres.search import (
+        SearchQuery, SearchRank, TrigramWordSimilarity)
+
+    search_query = SearchQuery(query, config='english', search_type='websearch')
+    return queryset.annotate(
+        search=search_vector(),
+        rank=SearchRank(search_vector(), search_query)
+        + TrigramWordSimilarity(query, 'model'),
+    ).filter(Q(search=search_query) | Q(model__icontains=query))
+
+
+def _fallback_search(queryset, query):
+    condition = Q()
+    rank = Value(0.0, output_field=FloatField())
+    for field in SEARCH_FIELDS:
+        lookup = Q(**{f'{field}__icontains': query})
+        condition |= lookup
+        weight = FALLBACK_WEIGHTS[SEARCH_WEIGHTS[field]]
+        rank = rank + Case(When(lookup, then=Value(weight)), default=Value(0.0),
+                           output_field=FloatField())
+    return queryset.annotate(rank=rank).filter(condition)
+
+
+def search_listings(queryset, query):
+    """Filter ``queryset`` to listings matching ``query``, annotated with ``rank``.
+
+    PostgreSQL uses the full-text and trigram GIN indexes, any other backend
+    falls back to weighted ``icontains`` matching so tests can run offline.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, query)
+    return _fallback_search(queryset, query)
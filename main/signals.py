@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import Location, Profile
+from .blobs import release_blob, release_replaced_blob
+from .caching import bump_version
+from .facets import adjust_facet
+from .models import LikedListing, Listing, SavedSearch
+from .saved_searches import invalidate as invalidate_saved_searches, match_listings
+from .similar import index_listings, loaded_index
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def invalidate_listing_card(sender, instance, **kwargs):
+    bump_version('listing', instance.pk)
+
+
+@receiver([post_save, pre_delete], sender=Location)
+def invalidate_location_listing(sender, instance, created=False, **kwargs):
+    # pre_delete: once the location is gone the listing's location_id is already NULL
+    if created:
+        return
+    listings = Listing.objects.filter(location=instance)
+    for listing_id in listings.values_list('pk', flat=True):
+        bump_version('listing', listing_id)
+    if kwargs['signal'] is post_save and loaded_index() is not None:
+        # the county is one of the similarity features
+        index_listings(listings.select_related('location'))
+
+
+@receiver([post_save, post_delete], sender=LikedListing)
+def invalidate_liked_listing(sender, instance, **kwargs):
+    # cards show the like count, which set_liked updates after this row changes
+    transaction.on_commit(lambda: bump_version('listing', instance.listing_id))
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_seller_cards(sender, instance, **kwargs):
+    bump_version('seller', instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cards(sender, instance, created=False, update_fields=None, **kwargs):
+    # a new user has no cards yet, and login() saves last_login, which no card shows
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    for profile_id in Profile.objects.filter(user=instance).values_list('pk', flat=True):
+        bump_version('seller', profile_id)
+
+
+@receiver(pre_save, sender=Listing)
+def remember_listing_facet(sender, instance, **kwargs):
+    instance._previous_facet = instance._previous_image = None
+    if not instance._state.adding:
+        previous = Listing.objects.filter(pk=instance.pk).values_list(
+            'brand', 'transmission', 'image').first()
+        if previous is not None:
+            instance._previous_facet, instance._previous_image = previous[:2], previous[2]
+
+
+@receiver(post_save, sender=Listing)
+def update_listing_facet(sender, instance, created, **kwargs):
+    current = (instance.brand, instance.transmission)
+    previous = getattr(instance, '_previous_facet', None)
+    if previous == current:
+        return
+    if previous is not None:
+        adjust_facet(*previous, -1)
+    adjust_facet(*current, 1)
+
+
+@receiver(post_delete, sender=Listing)
+def remove_listing_facet(sender, instance, **kwargs):
+    adjust_facet(instance.brand, instance.transmission, -1)
+
+
+@receiver(post_save, sender=Listing)
+def release_replaced_listing_image(sender, instance, **kwargs):
+    release_replaced_blob(getattr(instance, '_previous_image', None), instance.image)
+
+
+@receiver(post_delete, sender=Listing)
+def release_listing_image(sender, instance, **kwargs):
+    release_blob(instance.image.name)
+
+
+@receiver(post_save, sender=Listing)
+def index_similar_listing(sender, instance, **kwargs):
+    index_listings([instance])
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_similar_listing(sender, instance, **kwargs):
+    index = loaded_index()
+    if index is not None:
+        index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Listing)
+def match_saved_searches(sender, instance, created, **kwargs):
+    if created:
+        match_listings([instance])
+
+
+@receiver([post_save, post_delete], sender=SavedSearch)
+def reindex_saved_searches(sender, instance, **kwargs):
+    invalidate_saved_searches()
@@ -0,0 +1,336 @@
+"""In-memory nearest-neighbour index over listing features.
+
+Every listing becomes one row of a float32 matrix. Categorical fields are
+one-hot columns, numeric ones are scaled to 0..1, and each block is
+multiplied by the square root of its weight. The weighted squared distance
+to every listing then comes out of a single matrix-vector product:
+``|x - q|^2 = |x|^2 - 2 x.q + |q|^2``.
+
+The index lives in each worker process. Listing save/delete receivers
+update it in place. Once it is older than ``SIMILAR_INDEX_MAX_AGE``, which
+picks up writes made by other processes, it is reloaded from the file that
+``manage.py build_similarity_index`` writes to ``SIMILAR_INDEX_PATH`` if
+that changed, or else rebuilt from the database in a background thread.
+Requests never scan the listings themselves: they keep the old index, or
+an empty one, until the new one is ready.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from irishgeo.fields import IRISH_COUNTIES
+
+from .consts import CARS_BRANDS, TRANSMISSION_OPTIONS
+from .models import Listing
+
+COLORS = ('white', 'black', 'grey', 'silver', 'blue', 'red', 'green', 'yellow',
+          'orange', 'brown', 'beige', 'gold', 'purple')
+
+# block -> (vocabulary or None for a single numeric column, weight)
+FEATURES = {
+    'brand': ([brand for brand, _ in CARS_BRANDS], 4.0),
+    'transmission': ([option for option, _ in TRANSMISSION_OPTIONS], 1.0),
+    'county': ([county for county, _ in IRISH_COUNTIES], 1.0),
+    'color': (COLORS, 0.5),
+    'engine': (None, 2.0),
+    'mileage': (None, 2.0),
+    'recency': (None, 0.5),
+}
+
+VALUE_FIELDS = ('id', 'brand', 'transmission', 'location__state', 'color', 'engine',
+                'mileage', 'created_at')
+
+logger = logging.getLogger(__name__)
+
+MAX_MILEAGE = 300000
+MAX_ENGINE_LITRES = 6.0
+MAX_AGE_DAYS = 365
+_LITRES = re.compile(r'(\d+(?:\.\d+)?)')
+
+
+def _layout():
+    offsets, width = {}, 0
+    for name, (vocabulary, _) in FEATURES.items():
+        size = len(vocabulary) if vocabulary else 1
+        offsets[name] = (width, size)
+        width += size
+    return offsets, width
+
+
+OFFSETS, WIDTH = _layout()
+_POSITIONS = {name: {value: i for i, value in enumerate(vocabulary)}
+              for name, (vocabulary, _) in FEATURES.items() if vocabulary}
+
+
+def engine_litres(engine):
+    """Displacement from free text such as '2.0L' or '1998cc', 0 when unknown."""
+    match = _LITRES.search(engine or '')
+    if not match:
+        return 0.0
+    litres = float(match.group(1))
+    return litres / 1000 if litres > 100 else litres
+
+
+def encode(brand, transmission, county, color, engine, mileage, created_at, now=None):
+    """Feature vector of one listing."""
+    now = now or timezone.now()
+    vector = np.zeros(WIDTH, dtype=np.float32)
+    categorical = {'brand': brand, 'transmission': transmission, 'county': county,
+                   'color': (color or '').strip().lower()}
+    for name, value in categorical.items():
+        position = _POSITIONS[name].get(value)
+        if position is not None:
+            vector[OFFSETS[name][0] + position] = math.sqrt(FEATURES[name][1])
+    numeric = {
+        'engine': min(engine_litres(engine) / MAX_ENGINE_LITRES, 1.0),
+        'mileage': math.log1p(max(mileage or 0, 0)) / math.log1p(MAX_MILEAGE),
+        'recency': min((now - created_at).days / MAX_AGE_DAYS, 1.0) if created_at else 1.0,
+    }
+    for name, value in numeric.items():
+        vector[OFFSETS[name][0]] = min(value, 1.0) * math.sqrt(FEATURES[name][1])
+    return vector
+
+
+def encode_listing(listing, now=None):
+    county = listing.location.state if listing.location_id and listing.location else None
+    return encode(listing.brand, listing.transmission, county, listing.color,
+                  listing.engine, listing.mileage, listing.created_at, now)
+
+
+class SimilarityIndex:
+    """Feature rows of all listings plus the bookkeeping to update them in place.
+
+    Deleted rows are blanked and reused by the next insert, and the arrays
+    grow by doubling, so single updates stay cheap.
+    """
+
+    def __init__(self, ids=(), matrix=None):
+        self.lock = threading.Lock()
+        count = len(ids)
+        capacity = max(count, 16)
+        self.ids = [None] * capacity
+        self.ids[:count] = ids
+        self.matrix = np.zeros((capacity, WIDTH), dtype=np.float32)
+        self.active = np.zeros(capacity, dtype=bool)
+        if count:
+            self.matrix[:count] = matrix
+            self.active[:count] = True
+        self.norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        self.rows = {listing_id: row for row, listing_id in enumerate(ids)}
+        self.free = []
+        self.size = count
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays and the id bookkeeping."""
+        return (self.matrix.nbytes + self.norms.nbytes + self.active.nbytes
+                + len(self.ids) * 8 + len(self.rows) * (16 + 8 + 8))
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        for name in ('matrix', 'norms', 'active'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.ids.extend([None] * (capacity - len(self.ids)))
+
+    def upsert(self, listing_id, vector):
+        with self.lock:
+            row = self.rows.get(listing_id)
+            if row is None:
+                if self.free:
+                    row = self.free.pop()
+                else:
+                    if self.size == len(self.ids):
+                        self._grow()
+                    row = self.size
+                    self.size += 1
+                self.rows[listing_id] = row
+                self.ids[row] = listing_id
+            self.matrix[row] = vector
+            self.norms[row] = vector @ vector
+            self.active[row] = True
+
+    def remove(self, listing_id):
+        with self.lock:
+            row = self.rows.pop(listing_id, None)
+            if row is None:
+                return
+            self.active[row] = False
+            self.matrix[row] = 0
+            self.norms[row] = 0
+            self.ids[row] = None
+            self.free.append(row)
+
+    def vector(self, listing_id):
+        row = self.rows.get(listing_id)
+        return None if row is None else self.matrix[row].copy()
+
+    def nearest(self, vector, k=6, exclude=None):
+        """``(listing_id, distance)`` of the ``k`` rows closest to ``vector``."""
+        with self.lock:
+            size = self.size
+            distances = self.norms[:size] - 2 * (self.matrix[:size] @ vector) + vector @ vector
+            distances[~self.active[:size]] = np.inf
+            row = self.rows.get(exclude)
+            if row is not None:
+                distances[row] = np.inf
+            ids = self.ids[:size]
+        k = min(k, len(self.rows) - (row is not None))
+        if k <= 0:
+            return []
+        # argpartition finds the k smallest in linear time, only those get sorted
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates = candidates[np.argsort(distances[candidates])]
+        return [(ids[i], float(max(distances[i], 0.0))) for i in candidates]
+
+    def save(self, path):
+        live = [row for row in range(self.size) if self.active[row]]
+        with open(path, 'wb') as file:
+            np.savez(file, ids=np.array([str(self.ids[row]) for row in live]),
+                     matrix=self.matrix[live])
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls([uuid.UUID(value) for value in data['ids']], data['matrix'])
+
+
+def build_index(queryset=None, chunk_size=2000):
+    """Build an index of ``queryset`` (every listing by default) from the database."""
+    queryset = queryset if queryset is not None else Listing.objects.all()
+    now = timezone.now()
+    ids, rows = [], []
+    for values in queryset.order_by().values_list(*VALUE_FIELDS).iterator(chunk_size=chunk_size):
+        listing_id, brand, transmission, county, color, engine, mileage, created_at = values
+        ids.append(listing_id)
+        rows.append(encode(brand, transmission, county, color, engine, mileage, created_at, now))
+    matrix = np.vstack(rows) if rows else np.zeros((0, WIDTH), dtype=np.float32)
+    return SimilarityIndex(ids, matrix)
+
+
+_index = None
+_index_lock = threading.Lock()
+_index_file_mtime = None
+_rebuilding = False
+
+
+def get_index():
+    """This process's index, refreshed once older than ``SIMILAR_INDEX_MAX_AGE``.
+
+    A changed ``SIMILAR_INDEX_PATH`` file is loaded here; a rebuild from the
+    database runs in the background, see ``rebuild_in_background``.
+    """
+    global _index, _index_file_mtime
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < settings.SIMILAR_INDEX_MAX_AGE:
+        return index
+    with _index_lock:
+        if _index is not index:
+            return _index
+        path = settings.SIMILAR_INDEX_PATH
+        if path and os.path.exists(path):
+            mtime = os.path.getmtime(path)
+            if index is None or mtime != _index_file_mtime:
+                _index, _index_file_mtime = SimilarityIndex.load(path), mtime
+            else:
+                # the file has not been rebuilt yet, look again after another interval
+                index.built_at = time.monotonic()
+            return _index
+        if _index is None:
+            _index = SimilarityIndex()
+            # expired, so the rebuild below replaces it rather than waiting an interval
+            _index.built_at -= settings.SIMILAR_INDEX_MAX_AGE
+    rebuild_in_background()
+    return _index
+
+
+def rebuild_index():
+    """Build this process's index from the database on this thread and install it."""
+    global _index
+    index = build_index()
+    with _index_lock:
+        _index = index
+    return index
+
+
+def _rebuild():
+    global _rebuilding
+    try:
+        rebuild_index()
+    except Exception:
+        logger.exception('Rebuilding the similar listings index failed')
+    finally:
+        _rebuilding = False
+        connections.close_all()
+
+
+def rebuild_in_background():
+    """Start one rebuild thread unless one is running or ``SIMILAR_INDEX_REBUILD`` is off."""
+    global _rebuilding
+    if not settings.SIMILAR_INDEX_REBUILD:
+        return
+    with _index_lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, name='similar-index', daemon=True).start()
+
+
+def loaded_index():
+    """The index if this process has built one, without building it."""
+    return _index
+
+
+def reset_index():
+    global _index, _index_file_mtime
+    with _index_lock:
+        _index = _index_file_mtime = None
+
+
+def index_listings(listings):
+    """Add or refresh ``listings`` in this process's index, if it has one.
+
+    For writes that skip the save receivers, such as ``bulk_create``.
+    """
+    index = _index
+    if index is not None:
+        now = timezone.now()
+        for listing in listings:
+            index.upsert(listing.pk, encode_listing(listing, now))
+
+
+def similar_listing_ids(listing_id, k=None):
+    """``(listing_id, distance)`` of the listings most like ``listing_id``, closest first.
+
+    ``None`` when there is no such listing.
+    """
+    index = get_index()
+    vector = index.vector(listing_id)
+    if vector is None:
+        listing = Listing.objects.select_related('location').filter(pk=listing_id).first()
+        if listing is None:
+            return None
+        vector = encode_listing(listing)
+    return index.nearest(vector, k or settings.SIMILAR_LISTINGS_COUNT, exclude=listing_id)
+
+
+def similar_listings(listing_id, k=None):
+    """The listings most like ``listing_id`` as model instances, closest first."""
+    ranked = similar_listing_ids(listing_id, k) or []
+    found = Listing.objects.select_related('seller__user', 'location').in_bulk(
+        [similar_id for similar_id, _ in ranked])
+    return [found[similar_id] for similar_id, _ in ranked if similar_id in found]
@@ -1,14 +1,16 @@
-import boto3
+import time
+
 from django.conf import settings
 
+from .aws import get_client
+
+# SNS PublishBatch accepts at most ten entries per call
+SNS_BATCH_SIZE = 10
+
+
 def send_sns_email(subject, message):
     """Send an email using AWS SNS."""
-    sns_client = boto3.client(
-        'sns',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME,
-    )
+    sns_client = get_client('sns')
     try:
         response = sns_client.publish(
             TopicArn=settings.SNS_TOPIC_ARN,
@@ -19,3 +21,47 @@ def send_sns_email(subject, message):
     except Exception as e:
         print(f"Error sending SNS email: {e}")
         return None
+
+
+class SNSPublisher:
+    """Publishes outbox messages to the SNS topic through the shared client."""
+
+    def publish_batch(self, messages):
+        """Publish ``(id, subject, message)`` tuples, return ``{id: error}`` for failures."""
+        failures = {}
+        for start in range(0, len(messages), SNS_BATCH_SIZE):
+            chunk = messages[start:start + SNS_BATCH_SIZE]
+            try:
+                response = get_client('sns').publish_batch(
+                    TopicArn=settings.SNS_TOPIC_ARN,
+                    PublishBatchRequestEntries=[
+                        {'Id': str(pk), 'Subject': subject, 'Message': message}
+                        for pk, subject, message in chunk
+                    ],
+                )
+            except Exception as e:
+                failures.update({pk: str(e) for pk, _, _ in chunk})
+                continue
+            for failed in response.get('Failed', []):
+                failures[int(failed['Id'])] = failed.get('Message') or failed['Code']
+        return failures
+
+
+class LocalPublisher:
+    """In-process stand-in for SNS, records what would have been sent."""
+
+    sent = []
+    failing_ids = set()
+    # seconds each call takes, to stand in for a slow SNS endpoint
+    delay = 0
+
+    def publish_batch(self, messages):
+        if self.delay:
+            time.sleep(self.delay)
+        failures = {}
+        for pk, subject, message in messages:
+            if pk in self.failing_ids:
+                failures[pk] = 'Simulated failure'
+            else:
+                self.sent.append((subject, message))
+        return failures
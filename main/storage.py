@@ -0,0 +1,24 @@
+from storages.backends.s3 import S3Storage
+
+from automotive.timing import timed
+
+from . import aws
+
+
+class PooledS3Storage(S3Storage):
+    """S3 storage that shares the session and pool settings in ``main.aws``."""
+
+    @property
+    def connection(self):
+        return aws.get_resource('s3')
+
+    def url(self, name, *args, **kwargs):
+        # presigning runs locally but once per image, which adds up on the grid
+        with timed('storage'):
+            return super().url(name, *args, **kwargs)
+
+
+class PooledS3StaticStorage(PooledS3Storage):
+    """Querystring auth must be disabled so that url() returns a consistent output."""
+
+    querystring_auth = False
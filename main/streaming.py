@@ -0,0 +1,76 @@
+"""Streamed rendering of the home grid, used when ``HOME_STREAMING`` is on.
+
+The page is rendered once up front with markers where the cards and the
+pager go, so the head, the filter form and everything after the grid are
+ready before the response starts. That eager render also reads the
+messages and creates the CSRF token while the middleware can still add
+their cookies. The cards are then rendered and sent in chunks as the
+database cursor yields rows, and the pager follows once the page is read.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .caching import render_listing_cards
+from .pagination import InvalidCursor, StreamedPage
+
+TEMPLATE = 'views/home.html'
+CARDS_MARKER = '<!--stream:cards-->'
+PAGER_MARKER = '<!--stream:pager-->'
+
+
+def render_shell(request, context):
+    """The home page split into the HTML before the cards, before the pager and after it."""
+    get_token(request)
+    html = render_to_string(TEMPLATE, {**context, 'streaming': True}, request)
+    head, rest = html.split(CARDS_MARKER, 1)
+    middle, tail = rest.split(PAGER_MARKER, 1)
+    return head, middle, tail
+
+
+def prepare(request, listing_filter):
+    """Everything that has to happen before the response is returned."""
+    # the replica routing of the view has ended by the time the rows are read
+    queryset = listing_filter.qs
+    queryset = queryset.using(router.db_for_read(queryset.model))
+    args = (settings.HOME_STREAM_PAGE_SIZE, listing_filter.ordering,
+            settings.HOME_STREAM_CHUNK_SIZE)
+    try:
+        page = StreamedPage(queryset, request.GET.get('cursor'), *args)
+    except InvalidCursor:
+        page = StreamedPage(queryset, None, *args)
+    return page, render_shell(request, {'listing_filter': listing_filter, 'page': page})
+
+
+def chunks(request, user, page, shell):
+    head, middle, tail = shell
+    yield head
+    for rows in page.chunks():
+        yield render_to_string('components/listing_columns.html',
+                               {'cards': render_listing_cards(rows, user)})
+    yield middle
+    yield render_to_string('components/home_pager.html', {'page': page}, request)
+    yield tail
+
+
+def stream_home(request, listing_filter):
+    page, shell = prepare(request, listing_filter)
+    return StreamingHttpResponse(chunks(request, request.user, page, shell),
+                                 content_type='text/html; charset=utf-8')
+
+
+async def _aiterate(iterator):
+    # every step runs on the same thread, which owns the database cursor
+    step = sync_to_async(next)
+    while (chunk := await step(iterator, None)) is not None:
+        yield chunk
+
+
+async def astream_home(request, listing_filter):
+    user = await request.auser()
+    page, shell = await sync_to_async(prepare)(request, listing_filter)
+    return StreamingHttpResponse(_aiterate(chunks(request, user, page, shell)),
+                                 content_type='text/html; charset=utf-8')
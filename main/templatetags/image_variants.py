@@ -0,0 +1,23 @@
+from django import template
+
+from main.images import VARIANTS, variant_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def variant_url(fieldfile, variant, fmt='jpeg'):
+    """URL of one generated variant of ``fieldfile``."""
+    if not fieldfile:
+        return ''
+    return fieldfile.storage.url(variant_name(fieldfile.name, variant, fmt))
+
+
+@register.simple_tag
+def variant_srcset(fieldfile, variants, fmt='jpeg'):
+    """``srcset`` value for space separated ``variants``, e.g. ``'thumb card'``."""
+    if not fieldfile:
+        return ''
+    return ', '.join(
+        f'{variant_url(fieldfile, variant, fmt)} {VARIANTS[variant][0]}w'
+        for variant in variants.split())
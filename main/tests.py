@@ -1,3 +1,1268 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from botocore.stub import Stubber
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from automotive.routers import ReplicaRouter, ReplicaRoutingMiddleware, replica_reads
+from automotive.timing import ServerTimingMiddleware, timed
+from users.forms import ProfileForm
+from users.models import Location
+
+from . import async_views, aws
+from .benchmark import compare, percentile, run_benchmarks, seed
+from .blobs import HashingMemoryFileUploadHandler, blob_stats
+from .caching import card_cache_stats, render_listing_cards
+from .checks import check_cache_versions
+from .facets import facet_counts, rebuild_facets
+from .filters import ListingFilter
+from .forms import ListingForm
+from .images import FORMATS, LISTING_VARIANTS, variant_name
+from .likes import set_liked
+from .models import (
+    LikedListing, Listing, ListingFacet, OutboxMessage, SavedSearch, SavedSearchMatch, StoredBlob)
+from .outbox import drain, enqueue, publish_now
+from .pagination import InvalidCursor, encode_cursor, paginate
+from .saved_searches import SearchIndex, get_index as saved_search_index, queue_digests
+from .saved_searches import invalidate as invalidate_saved_searches
+from . import similar
+from .similar import build_index, get_index, rebuild_index, reset_index, similar_listing_ids
+from .sns_email import LocalPublisher, SNSPublisher
+from . import view_counts
+
+
+def create_listing(seller, **fields):
+    values = {'brand': 'bmw', 'model': 'M3', 'vin': '1HGCM82633A004352',
+              'mileage': 1000, 'description': 'Clean car', 'engine': '3.0L',
+              'transmission': 'manual', 'image': 'user_1/listings/car.jpeg'}
+    values.update(fields)
+    return Listing.objects.create(seller=seller, **values)
+
+
+# ROOT_URLCONF for the async view tests: the async views shadow the sync ones
+urlpatterns = [
+    path('home/', async_views.home_view, name='home'),
+    path('listing/<str:id>/', async_views.listing_view, name='listing'),
+    path('listing/<str:id>/enquire/', async_views.enquire_listing_by_email,
+         name='enquire_listing'),
+    path('', include('automotive.urls')),
+]
+
+
+# a rebuild thread would read the listings outside the test's transaction
+@override_settings(SIMILAR_INDEX_REBUILD=False)
+class ListingTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller', password='pass12345')
+        cls.profile = cls.user.profile
+
+
+class KeysetPaginationTests(ListingTestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.listings = []
+        for i in range(7):
+            listing = create_listing(self.profile, model=f'Car {i}')
+            # two rows share a timestamp so the id tie-breaker is exercised
+            Listing.objects.filter(pk=listing.pk).update(
+                created_at=now - timedelta(minutes=i // 2))
+            self.listings.append(listing)
+
+    def test_walks_forward_and_back_without_gaps(self):
+        seen = []
+        cursor = None
+        pages = []
+        while True:
+            page = paginate(Listing.objects.all(), cursor, page_size=3)
+            pages.append(page)
+            seen.extend(listing.pk for listing in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+        previous = paginate(Listing.objects.all(), pages[1].prev_cursor, page_size=3)
+        self.assertEqual([l.pk for l in previous], [l.pk for l in pages[0]])
+        self.assertFalse(previous.has_previous)
+
+    def test_cursor_with_values_of_the_wrong_type_is_invalid(self):
+        for values in (['yesterday', '1'], ['2024-01-01T00:00:00+00:00', 'one'], [[], {}]):
+            with self.subTest(values=values), self.assertRaises(InvalidCursor):
+                paginate(Listing.objects.all(), encode_cursor('n', values), page_size=3)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'),
+                                   {'cursor': encode_cursor('n', ['yesterday', '1'])})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_respects_filters(self):
+        create_listing(self.profile, brand='audi', model='A4')
+        page = paginate(Listing.objects.filter(brand='audi'), page_size=3)
+        self.assertEqual([l.model for l in page], ['A4'])
+        self.assertFalse(page.has_next)
+
+
+@override_settings(LISTINGS_PAGE_SIZE=5)
+class HomeViewTests(ListingTestCase):
+
+    def test_query_count_does_not_grow_with_page(self):
+        self.client.force_login(self.user)
+        for i in range(5):
+            create_listing(self.profile, model=f'Car {i}')
+        # the session comes from the cache, the user with its profile in one query,
+        # then facets, the page and the page's likes
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('home'), {'brand': 'bmw'})
+        self.assertEqual(len(response.context['page']), 5)
+
+
+class SearchTests(ListingTestCase):
+
+    def test_q_filter_ranks_model_matches_first(self):
+        create_listing(self.profile, model='Civic', description='Not a golf')
+        create_listing(self.profile, model='Golf GTI', description='Hot hatch')
+        create_listing(self.profile, model='Corolla', description='Family car')
+        filterset = ListingFilter({'q': 'golf'}, queryset=Listing.objects.all())
+        page = paginate(filterset.qs, page_size=10, ordering=filterset.ordering)
+        self.assertEqual([l.model for l in page], ['Golf GTI', 'Civic'])
+
+    def test_ranked_cursor_reaches_every_match(self):
+        for i in range(5):
+            create_listing(self.profile, model=f'Golf {i}', description='golf')
+        filterset = ListingFilter({'q': 'golf'}, queryset=Listing.objects.all())
+        first = paginate(filterset.qs, page_size=3, ordering=filterset.ordering)
+        second = paginate(filterset.qs, first.next_cursor, 3, filterset.ordering)
+        self.assertEqual(len(first) + len(second), 5)
+        self.assertFalse(second.has_next)
+
+
+class CardCacheTests(ListingTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.listing = create_listing(self.profile, model='Supra')
+
+    def render(self):
+        return render_listing_cards(
+            Listing.objects.select_related('seller__user'), self.user)[0][1]
+
+    def test_second_render_is_a_hit(self):
+        self.render()
+        self.render()
+        self.assertEqual(card_cache_stats()['hits'], 1)
+        self.assertEqual(card_cache_stats()['misses'], 1)
+
+    def test_listing_save_invalidates_card(self):
+        self.render()
+        self.listing.model = 'Celica'
+        self.listing.save()
+        self.assertIn('Celica', self.render())
+
+    def test_username_change_invalidates_card(self):
+        self.render()
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertIn('renamed', self.render())
+        self.assertEqual(card_cache_stats()['misses'], 2)
+
+
+class LikeTests(ListingTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.listing = create_listing(self.profile, model='Supra')
+        self.buyer = User.objects.create_user('buyer', password='pass12345')
+        self.client.force_login(self.buyer)
+
+    def like(self, liked, listing_id=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('like_listing', args=[listing_id or self.listing.pk]),
+                                    {'liked': liked})
+
+    def test_endpoint_is_idempotent(self):
+        for _ in range(2):
+            response = self.like('true')
+            self.assertEqual(response.json(), {'success': True, 'liked': True, 'like_count': 1})
+        self.assertEqual(LikedListing.objects.count(), 1)
+        for _ in range(2):
+            self.assertEqual(self.like('false').json()['like_count'], 0)
+        self.assertFalse(LikedListing.objects.exists())
+        self.assertEqual(self.like('maybe').status_code, 400)
+        self.assertEqual(self.like('true', uuid.uuid4()).status_code, 404)
+
+    def test_counter_is_not_overwritten_by_a_stale_save(self):
+        stale = Listing.objects.get(pk=self.listing.pk)
+        set_liked(self.buyer.profile, self.listing, True)
+        stale.model = 'Celica'
+        stale.save()
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.model, self.listing.like_count), ('Celica', 1))
+
+    def test_saving_a_deleted_listing_inserts_it_again(self):
+        listing = Listing.objects.get(pk=self.listing.pk)
+        Listing.objects.filter(pk=listing.pk).delete()
+        listing.save()
+        self.assertTrue(Listing.objects.filter(pk=listing.pk, model='Supra').exists())
+
+    def test_force_insert_still_works(self):
+        set_liked(self.buyer.profile, self.listing, True)
+        listing = Listing.objects.get(pk=self.listing.pk)
+        Listing.objects.filter(pk=listing.pk).delete()
+        listing.save(force_insert=True)
+        self.assertEqual(Listing.objects.get(pk=listing.pk).like_count, 1)
+
+    def test_liked_ids_are_one_query_per_page(self):
+        for n in range(4):
+            other = create_listing(self.profile, model=f'Roadster {n}')
+            set_liked(self.buyer.profile, other, True)
+        self.client.get(reverse('home'))
+        # facets, the page and one query for the likes of all its cards
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        liked = [card for _, card in response.context['cards'] if 'data-liked="true"' in card]
+        self.assertEqual(len(liked), 4)
+
+    def test_like_changes_the_cached_card(self):
+        render = lambda: render_listing_cards(
+            Listing.objects.select_related('seller__user'), self.buyer)[0][1]
+        self.assertIn('data-liked="false"', render())
+        self.like('true')
+        card = render()
+        self.assertIn('data-liked="true"', card)
+        self.assertIn('<span class="like-count">1</span>', card)
+
+
+@override_settings(NOTIFICATION_PUBLISHER='main.sns_email.LocalPublisher')
+class OutboxTests(ListingTestCase):
+
+    def setUp(self):
+        LocalPublisher.sent = []
+        LocalPublisher.failing_ids = set()
+        self.listing = create_listing(self.profile)
+
+    def test_enquiry_is_queued_not_sent(self):
+        buyer = User.objects.create_user('buyer', password='pass12345')
+        self.client.force_login(buyer)
+        response = self.client.post(reverse('enquire_listing', args=[self.listing.pk]))
+        self.assertEqual(response.status_code, 202)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertEqual(message.listing, self.listing)
+        self.assertEqual(LocalPublisher.sent, [])
+
+        self.assertEqual(drain(), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.SENT)
+        self.assertEqual(len(LocalPublisher.sent), 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        message = enqueue('Subject', 'Body')
+        LocalPublisher.failing_ids = {message.pk}
+        self.assertEqual(drain(), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertEqual(drain(), (0, 0))
+
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        drain()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+        self.assertEqual(message.attempts, 2)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_raising_publisher_fails_the_whole_batch(self):
+        messages = [enqueue('Subject', f'Body {n}') for n in range(2)]
+        publisher = mock.Mock()
+        publisher.publish_batch.side_effect = ConnectionError('SNS unreachable')
+        with self.assertLogs('main.outbox', 'ERROR'):
+            self.assertEqual(drain(publisher=publisher), (0, 2))
+        for message in messages:
+            message.refresh_from_db()
+            self.assertEqual((message.status, message.attempts, message.last_error),
+                             (OutboxMessage.PENDING, 1, 'SNS unreachable'))
+            self.assertGreater(message.next_attempt_at, timezone.now())
+
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs('main.outbox', 'ERROR'):
+            drain(publisher=publisher)
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.FAILED).count(), 2)
+
+    def test_claimed_batch_is_leased_while_it_is_published(self):
+        enqueue('Subject', 'Body')
+
+        def publish_batch(messages):
+            # another worker draining meanwhile finds nothing due
+            self.assertEqual(drain(publisher=LocalPublisher()), (0, 0))
+            return {}
+
+        publisher = mock.Mock(publish_batch=publish_batch)
+        self.assertEqual(drain(publisher=publisher), (1, 0))
+
+
+class AWSRegistryTests(TestCase):
+
+    def setUp(self):
+        aws.reset()
+        self.addCleanup(aws.reset)
+
+    def test_client_is_shared_between_threads(self):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(aws.get_client('sns')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIs(aws.get_client('sns'), clients[0])
+
+    def test_stubbed_client_serves_sns_publisher(self):
+        client = aws.get_client('sns')
+        with Stubber(client) as stubber, aws.override_client('sns', client):
+            stubber.add_response('publish_batch', {
+                'Successful': [], 'Failed': [{'Id': '2', 'Code': 'Throttled',
+                                              'SenderFault': False}]})
+            failures = SNSPublisher().publish_batch([(1, 'A', 'a'), (2, 'B', 'b')])
+        self.assertEqual(failures, {2: 'Throttled'})
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_aws_calls_show_up_in_server_timing(self):
+        client = aws.get_client('sns')
+
+        def view(request):
+            with Stubber(client) as stubber:
+                stubber.add_response('publish', {'MessageId': '1'})
+                client.publish(TopicArn='arn:aws:sns:eu-west-1:123456789012:t', Message='x')
+            return HttpResponse()
+
+        with self.assertLogs('automotive.timing', 'INFO'):
+            response = ServerTimingMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('aws;dur=', response['Server-Timing'])
+        self.assertIn('AWS calls (1)', response['Server-Timing'])
+
+
+def image_upload(name='car.jpeg', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+LISTING_POST = {'brand': 'bmw', 'model': 'M3', 'vin': '1HGCM82633A004352',
+                'mileage': 1000, 'color': 'Blue', 'description': 'Clean car',
+                'engine': '3.0L', 'transmission': 'manual', 'address_1': '1 Main St',
+                'city': 'Dublin', 'state': 'D', 'zip_code': 'D02 X285'}
+
+
+# media on local disk under MEDIA_ROOT, so image tests never reach S3
+FILESYSTEM_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class ImageVariantTests(ListingTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root, STORAGES=FILESYSTEM_STORAGES)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_list_view_generates_variants(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('list'), {**LISTING_POST, 'image': image_upload()})
+        listing = Listing.objects.get()
+        storage = listing.image.storage
+        for variant in LISTING_VARIANTS:
+            for fmt in FORMATS:
+                self.assertTrue(storage.exists(variant_name(listing.image.name, variant, fmt)))
+        with storage.open(variant_name(listing.image.name, 'thumb', 'webp')) as thumb:
+            self.assertEqual(Image.open(thumb).size, (320, 213))
+
+
+class ContentAddressedImageTests(ListingTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root, STORAGES=FILESYSTEM_STORAGES)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.user)
+
+    def post_listing(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('list'), {**LISTING_POST, 'image': upload})
+        return Listing.objects.latest('created_at')
+
+    def test_identical_uploads_are_stored_once(self):
+        upload = image_upload()
+        size = upload.size
+        first = self.post_listing(upload)
+        second = self.post_listing(image_upload('same-car.JPEG'))
+        digest = hashlib.sha256(image_upload().read()).hexdigest()
+        self.assertEqual(first.image.name, f'blobs/{digest}.jpeg')
+        self.assertEqual(second.image.name, first.image.name)
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.ref_count, blob.reuse_count, blob.bytes_saved), (2, 1, size))
+        stats = blob_stats()
+        self.assertEqual((stats['upload_bytes_saved'], stats['storage_bytes_saved']), (size, size))
+        out = StringIO()
+        call_command('blob_stats', stdout=out)
+        self.assertIn(f'upload_bytes_saved={size}', out.getvalue())
+
+    def test_shared_file_is_deleted_with_its_last_reference(self):
+        first = self.post_listing(image_upload())
+        second = self.post_listing(image_upload())
+        storage, name = first.image.storage, first.image.name
+        card = variant_name(name, 'card', 'webp')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(card))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_replaced_image_is_released(self):
+        listing = self.post_listing(image_upload())
+        old = listing.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit', args=[listing.pk]),
+                             {**LISTING_POST, 'image': image_upload(size=(800, 600))})
+        listing.refresh_from_db()
+        self.assertNotEqual(listing.image.name, old)
+        self.assertFalse(listing.image.storage.exists(old))
+        self.assertEqual(list(StoredBlob.objects.values_list('name', flat=True)),
+                         [listing.image.name])
+
+    def test_uploading_the_same_image_again_keeps_one_reference(self):
+        listing = self.post_listing(image_upload())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit', args=[listing.pk]),
+                             {**LISTING_POST, 'image': image_upload()})
+        listing.refresh_from_db()
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.name, blob.ref_count), (listing.image.name, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_profile_photo_reusing_a_listing_blob_gets_its_avatar(self):
+        listing = self.post_listing(image_upload())
+        storage, name = listing.image.storage, listing.image.name
+        form = ProfileForm({'bio': '', 'phone_number': ''}, {'photo': image_upload()},
+                           instance=self.user.profile)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(self.user.profile.photo.name, name)
+        for fmt in FORMATS:
+            self.assertTrue(storage.exists(variant_name(name, 'avatar', fmt)))
+
+    def test_upload_handler_hashes_while_streaming(self):
+        data = image_upload().read()
+        handler = HashingMemoryFileUploadHandler()
+        handler.handle_raw_input(None, {}, len(data), 'boundary')
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file('image', 'car.jpeg', 'image/jpeg', len(data))
+        for start in range(0, len(data), 100):
+            self.assertIsNone(handler.receive_data_chunk(data[start:start + 100], start))
+        upload = handler.file_complete(len(data))
+        self.assertEqual(upload.content_sha256, hashlib.sha256(data).hexdigest())
+
+
+@override_settings(SIMILAR_INDEX_REBUILD=False)
+class FailedImageSaveTests(TransactionTestCase):
+    # a failed INSERT only leaves the reference behind once earlier statements committed
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root, STORAGES=FILESYSTEM_STORAGES)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.profile = User.objects.create_user('seller', password='pass12345').profile
+
+    def test_failed_insert_takes_no_reference(self):
+        def fail_listing_insert(execute, sql, params, many, context):
+            if sql.startswith('INSERT INTO "main_listing"'):
+                raise IntegrityError('simulated')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(fail_listing_insert), \
+                self.assertRaises(IntegrityError):
+            create_listing(self.profile, image=image_upload())
+        self.assertFalse(StoredBlob.objects.exists())
+        listing = create_listing(self.profile, image=image_upload())
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        listing.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='listings')
+class DirectUploadTests(ListingTestCase):
+
+    def setUp(self):
+        aws.reset()
+        self.addCleanup(aws.reset)
+        self.client.force_login(self.user)
+
+    def test_presigned_post_targets_users_listing_folder(self):
+        response = self.client.post(reverse('presign_upload'),
+                                    {'filename': 'my car.jpeg', 'content_type': 'image/jpeg'})
+        upload = response.json()
+        self.assertTrue(upload['key'].startswith(f'user_{self.user.id}/listings/'))
+        self.assertEqual(upload['fields']['Content-Type'], 'image/jpeg')
+        self.assertEqual(upload['fields']['key'], upload['key'])
+
+    def test_rejects_unsupported_content_type(self):
+        response = self.client.post(reverse('presign_upload'),
+                                    {'filename': 'x.exe', 'content_type': 'application/x-msdownload'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_form_attaches_verified_key(self):
+        key = f'user_{self.user.id}/listings/abc_car.jpeg'
+        client = aws.get_client('s3')
+        with Stubber(client) as stubber, aws.override_client('s3', client):
+            stubber.add_response('head_object', {'ContentLength': 2048,
+                                                 'ContentType': 'image/jpeg'})
+            form = ListingForm({**LISTING_POST, 'image_key': key}, user=self.user)
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.instance.image.name, key)
+
+    def test_form_rejects_someone_elses_key(self):
+        form = ListingForm({**LISTING_POST, 'image_key': 'user_999/listings/car.jpeg'},
+                           user=self.user)
+        self.assertIn('image_key', form.errors)
+
+
+class ListingsAPITests(ListingTestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.listing = create_listing(self.profile, model='Golf', brand='audi')
+        create_listing(self.profile, model='M3')
+
+    def test_search_returns_projected_rows(self):
+        response = self.client.get(reverse('api_listings'), {'brand': 'audi'})
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['id'], str(self.listing.pk))
+        self.assertEqual(results[0]['seller_name'], 'seller')
+        self.assertNotIn('description', results[0])
+
+    def test_unchanged_search_is_not_modified(self):
+        first = self.client.get(reverse('api_listings'), {'brand': 'audi'})
+        again = self.client.get(reverse('api_listings'), {'brand': 'audi'},
+                                HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        self.listing.mileage = 5000
+        self.listing.save()
+        changed = self.client.get(reverse('api_listings'), {'brand': 'audi'},
+                                  HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_detail_conditional_get_and_bad_id(self):
+        url = reverse('api_listing_detail', args=[self.listing.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.json()['model'], 'Golf')
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        missing = self.client.get(reverse('api_listing_detail', args=['not-a-uuid']))
+        self.assertEqual(missing.status_code, 404)
+
+
+class FacetTests(ListingTestCase):
+
+    def test_counts_follow_saves_and_deletes(self):
+        bmw = create_listing(self.profile, brand='bmw', transmission='manual')
+        create_listing(self.profile, brand='bmw', transmission='automatic')
+        create_listing(self.profile, brand='audi', transmission='manual')
+        self.assertEqual(facet_counts()['brand'], {'bmw': 2, 'audi': 1})
+        self.assertEqual(facet_counts(transmission='manual')['brand'], {'bmw': 1, 'audi': 1})
+
+        bmw.brand = 'audi'
+        bmw.save()
+        self.assertEqual(facet_counts(brand='audi')['transmission'], {'manual': 2})
+        bmw.delete()
+        self.assertEqual(facet_counts()['brand'], {'bmw': 1, 'audi': 1})
+
+    def test_rebuild_matches_incremental_counts(self):
+        create_listing(self.profile, brand='ford')
+        create_listing(self.profile, brand='ford')
+        before = facet_counts()
+        ListingFacet.objects.update(count=0)
+        rebuild_facets()
+        self.assertEqual(facet_counts(), before)
+
+    def test_filter_labels_show_counts(self):
+        create_listing(self.profile, brand='tesla', transmission='automatic')
+        listing_filter = ListingFilter({}, queryset=Listing.objects.all())
+        listing_filter.add_facet_counts()
+        choices = dict(listing_filter.form.fields['brand'].choices)
+        self.assertEqual(choices['tesla'], 'Tesla (1)')
+        self.assertEqual(choices['bmw'], 'BMW (0)')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def run_view(self, request, view):
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        return middleware(request)
+
+    def test_reads_use_replica_until_the_request_writes(self):
+        router = ReplicaRouter()
+        decisions = []
+
+        @replica_reads
+        def view(request):
+            decisions.append(router.db_for_read(Listing))
+            router.db_for_write(Listing)
+            decisions.append(router.db_for_read(Listing))
+            return HttpResponse()
+
+        response = self.run_view(RequestFactory().get('/'), view)
+        self.assertEqual(decisions, ['replica', 'default'])
+        self.assertIn(ReplicaRoutingMiddleware.cookie_name, response.cookies)
+
+    def test_unsafe_methods_pin_and_unmarked_views_stay_on_primary(self):
+        router = ReplicaRouter()
+        decisions = []
+
+        def view(request):
+            decisions.append(router.db_for_read(Listing))
+            return HttpResponse()
+
+        self.run_view(RequestFactory().get('/'), view)
+        self.run_view(RequestFactory().post('/'), replica_reads(view))
+        pinned = RequestFactory().get('/')
+        pinned.COOKIES[ReplicaRoutingMiddleware.cookie_name] = '1'
+        self.run_view(pinned, replica_reads(view))
+        self.assertEqual(decisions, ['default', 'default', 'default'])
+        self.assertEqual(router.db_for_read(Listing), 'default')
+
+
+@skipUnless('replica' in settings.DATABASES, 'set USE_SQLITE and SQLITE_REPLICA')
+class SQLiteReplicaTests(TransactionTestCase):
+    # rows must be committed for the replica connection to see them
+    databases = '__all__'
+
+    def test_home_grid_reads_from_replica(self):
+        user = User.objects.create_user('seller', password='pass12345')
+        create_listing(user.profile)
+        self.client.force_login(user)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.client.get(reverse('home'))
+        self.assertTrue(any('main_listing' in q['sql'] for q in replica_queries))
+
+
+class InventoryImportTests(ListingTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(MEDIA_ROOT=os.path.join(self.directory, 'media'),
+                                     STORAGES=FILESYSTEM_STORAGES)
+        override.enable()
+        self.addCleanup(override.disable)
+        Image.new('RGB', (10, 10)).save(os.path.join(self.directory, 'car.jpeg'))
+
+    def write_feed(self, rows):
+        path = os.path.join(self.directory, 'feed.csv')
+        with open(path, 'w', newline='') as feed:
+            writer = csv.DictWriter(feed, fieldnames=[*LISTING_POST, 'image'])
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_imports_valid_rows_and_rejects_bad_ones(self):
+        good = {**LISTING_POST, 'image': 'car.jpeg'}
+        path = self.write_feed([good, {**good, 'zip_code': 'nope'}, good,
+                                {**good, 'image': 'missing.jpeg'}])
+        call_command('import_inventory', path, seller='seller', batch_size=2,
+                     image_root=self.directory, rejects=path + '.rejects',
+                     stdout=StringIO())
+        self.assertEqual(Listing.objects.count(), 2)
+        self.assertEqual(Listing.objects.exclude(location=None).count(), 2)
+        self.assertEqual(facet_counts()['brand'], {'bmw': 2})
+        # both rows use the same photo, which is stored once
+        self.assertEqual(list(StoredBlob.objects.values_list('ref_count', 'reuse_count')), [(2, 1)])
+        image = Listing.objects.first().image
+        for variant in LISTING_VARIANTS:
+            for fmt in FORMATS:
+                self.assertTrue(image.storage.exists(variant_name(image.name, variant, fmt)))
+        with open(path + '.rejects') as rejects:
+            self.assertEqual([json.loads(line)['line'] for line in rejects], [3, 5])
+        with open(path + '.checkpoint') as checkpoint:
+            self.assertEqual(checkpoint.read(), '5')
+
+    def test_resume_skips_imported_rows(self):
+        good = {**LISTING_POST, 'image': 'car.jpeg'}
+        path = self.write_feed([good, good, good])
+        with open(path + '.checkpoint', 'w') as checkpoint:
+            checkpoint.write('3')
+        call_command('import_inventory', path, seller='seller', resume=True,
+                     image_root=self.directory, stdout=StringIO())
+        self.assertEqual(Listing.objects.count(), 1)
+
+
+class ExportTests(ListingTestCase):
+
+    def setUp(self):
+        create_listing(self.profile, brand='audi', model='A4')
+        create_listing(self.profile, brand='bmw', model='M3')
+
+    def test_staff_export_streams_filtered_csv(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_listings'), {'brand': 'audi'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['model'] for row in rows], ['A4'])
+        self.assertEqual(rows[0]['seller'], 'seller')
+
+    def test_command_writes_jsonl(self):
+        out = StringIO()
+        call_command('export_listings', format='jsonl', model='m', stdout=out)
+        self.assertEqual([json.loads(line)['model'] for line in out.getvalue().splitlines()],
+                         ['M3'])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}})
+class BenchmarkTests(TestCase):
+
+    def test_seed_is_reproducible_and_covers_every_brand(self):
+        data = seed(users=3, listings=40, seed=7)
+        self.assertEqual(Listing.objects.count(), 40)
+        self.assertEqual(Listing.objects.values('brand').distinct().count(), 16)
+        self.assertEqual(sum(facet_counts()['brand'].values()), 40)
+        first = list(Listing.objects.order_by('vin').values_list('vin', 'mileage'))
+        Listing.objects.all().delete()
+        User.objects.all().delete()
+        seed(users=3, listings=40, seed=7)
+        self.assertEqual(list(Listing.objects.order_by('vin').values_list('vin', 'mileage')), first)
+        self.assertTrue(data['listing_id'])
+
+    def test_reports_every_view(self):
+        results = run_benchmarks(seed(users=2, listings=10), requests=2, warmup=0)
+        self.assertEqual(set(results), {'home', 'home_filtered', 'listing', 'profile', 'list'})
+        self.assertGreater(results['home']['bytes'], 0)
+        self.assertGreater(results['home']['queries'], 0)
+
+    def test_percentile_and_compare(self):
+        self.assertEqual(percentile(range(1, 101), 95), 95)
+        self.assertEqual(percentile([3.0], 50), 3.0)
+        baseline = {'home': {'p95_ms': 10.0, 'queries': 4, 'bytes': 1000}}
+        self.assertEqual(compare({'home': {'p95_ms': 11.9, 'queries': 4, 'bytes': 1100}},
+                                 baseline, 0.2), [])
+        regressions = compare({'home': {'p95_ms': 12.5, 'queries': 5, 'bytes': 1300},
+                               'new': {'p95_ms': 1, 'queries': 1, 'bytes': 1}}, baseline, 0.2)
+        self.assertEqual(len(regressions), 3)
+
+
+class ServerTimingTests(ListingTestCase):
+
+    def setUp(self):
+        create_listing(self.profile)
+        self.client.force_login(self.user)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_request_reports_db_and_template_time(self):
+        with self.assertLogs('automotive.timing', 'INFO') as logs:
+            response = self.client.get(reverse('home'))
+        header = response['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn('tpl;dur=', header)
+        self.assertIn('total;dur=', header)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['path'], reverse('home'))
+        self.assertGreater(line['queries'], 0)
+        self.assertEqual(line['duplicate_queries'], 0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_request_has_no_header(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_repeated_queries_are_flagged(self):
+        def view(request):
+            for _ in range(3):
+                list(Listing.objects.filter(seller=self.profile))
+            with timed('aws'):
+                pass
+            return HttpResponse()
+
+        with self.assertLogs('automotive.timing', 'INFO') as logs:
+            response = ServerTimingMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('rep;desc="2 repeated queries"', response['Server-Timing'])
+        self.assertIn('dup;desc="2 duplicate queries"', response['Server-Timing'])
+        self.assertIn('aws;dur=', response['Server-Timing'])
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertIn('main_listing', line['most_duplicated_sql'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_n_plus_one_with_different_params_is_flagged(self):
+        def view(request):
+            for pk in range(3):
+                Listing.objects.filter(pk=pk).first()
+            return HttpResponse()
+
+        with self.assertLogs('automotive.timing', 'INFO') as logs:
+            response = ServerTimingMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('rep;desc="2 repeated queries"', response['Server-Timing'])
+        self.assertNotIn('dup;', response['Server-Timing'])
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['repeated_queries'], line['duplicate_queries']), (2, 0))
+        self.assertIn('main_listing', line['most_repeated_sql'])
+
+
+@override_settings(ROOT_URLCONF='main.tests', LISTINGS_PAGE_SIZE=5,
+                   NOTIFICATION_PUBLISHER='main.sns_email.LocalPublisher')
+class AsyncViewTests(ListingTestCase):
+
+    def setUp(self):
+        LocalPublisher.sent = []
+        LocalPublisher.delay = 0
+        self.addCleanup(setattr, LocalPublisher, 'delay', 0)
+        self.listing = create_listing(self.profile, model='Async Roadster')
+        self.buyer = User.objects.create_user('buyer', password='pass12345')
+
+    async def test_home_and_listing_render_like_the_sync_views(self):
+        await self.async_client.aforce_login(self.buyer)
+        response = await self.async_client.get(reverse('home'), {'brand': 'bmw'})
+        self.assertContains(response, 'Async Roadster')
+        self.assertEqual(len(response.context['page']), 1)
+        response = await self.async_client.get(reverse('listing', args=[self.listing.pk]))
+        self.assertContains(response, 'Async Roadster')
+        response = await self.async_client.get(reverse('listing', args=['not-a-uuid']))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    @override_settings(OUTBOX_IMMEDIATE_DISPATCH=True)
+    async def test_enquiry_is_published_immediately(self):
+        await self.async_client.aforce_login(self.buyer)
+        response = await self.async_client.post(reverse('enquire_listing', args=[self.listing.pk]))
+        self.assertEqual(response.status_code, 202)
+        message = await OutboxMessage.objects.aget()
+        self.assertEqual(message.status, OutboxMessage.SENT)
+        self.assertEqual(len(LocalPublisher.sent), 1)
+
+    @override_settings(OUTBOX_IMMEDIATE_DISPATCH=True, OUTBOX_DISPATCH_TIMEOUT=0.01)
+    async def test_slow_publish_finishes_after_the_response(self):
+        LocalPublisher.delay = 0.2
+        await self.async_client.aforce_login(self.buyer)
+        response = await self.async_client.post(reverse('enquire_listing', args=[self.listing.pk]))
+        self.assertEqual(response.status_code, 202)
+        message = await OutboxMessage.objects.aget()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        # held back from the worker while the immediate publish runs
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        await asyncio.gather(*async_views._background)
+        await message.arefresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.SENT)
+
+    def test_failed_immediate_publish_is_left_to_the_worker(self):
+        message = enqueue('Subject', 'Body', hold=True)
+        LocalPublisher.failing_ids = {message.pk}
+        self.addCleanup(setattr, LocalPublisher, 'failing_ids', set())
+        self.assertFalse(publish_now(message))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertEqual(drain(), (0, 0))
+
+
+class CacheVersionCheckTests(SimpleTestCase):
+
+    @override_settings(DEBUG=False, ALLOW_LOCAL_CACHE=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_fails_in_production(self):
+        self.assertEqual([error.id for error in check_cache_versions(None)], ['main.E001'])
+
+    @override_settings(DEBUG=True, ALLOW_LOCAL_CACHE=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_is_fine_in_debug(self):
+        self.assertEqual(check_cache_versions(None), [])
+
+
+class ListingDetailCacheTests(ListingTestCase):
+
+    def setUp(self):
+        cache.clear()
+        reset_index()
+        # a due view count flush would add an UPDATE to the counted queries
+        view_counts.reset()
+        self.listing = create_listing(self.profile, model='Detail Roadster',
+                                      location=Location.objects.create(city='Dublin'))
+        self.client.force_login(self.user)
+        self.url = reverse('listing', args=[self.listing.pk])
+        self.client.get(reverse('main'))
+        rebuild_index()
+
+    def test_malformed_id_never_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('listing', args=['not-a-uuid']))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    def test_second_view_is_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(self.url), 'Detail Roadster')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Detail Roadster')
+        self.assertContains(response, reverse('enquire_listing', args=[self.listing.pk]))
+
+    def test_listing_location_and_seller_changes_invalidate(self):
+        self.client.get(self.url)
+        self.listing.model = 'Renamed Roadster'
+        self.listing.save()
+        self.assertContains(self.client.get(self.url), 'Renamed Roadster')
+
+        self.listing.location.city = 'Galway'
+        self.listing.location.save()
+        self.assertContains(self.client.get(self.url), 'Galway')
+
+        self.profile.phone_number = '0871234567'
+        self.profile.save()
+        self.assertContains(self.client.get(self.url), '0871234567')
+
+
+class SimilarListingsTests(ListingTestCase):
+
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        dublin = {'location': Location.objects.create(city='Dublin', state='D')}
+        self.target = create_listing(self.profile, brand='bmw', model='M3', mileage=20000,
+                                     engine='3.0L', color='Blue', **dublin)
+        self.close = create_listing(self.profile, brand='bmw', model='M4', mileage=25000,
+                                    engine='3.0L', color='Blue')
+        self.far = create_listing(self.profile, brand='tesla', model='S', mileage=150000,
+                                  engine='Electric', transmission='automatic')
+        rebuild_index()
+
+    def test_nearest_ranks_by_weighted_distance(self):
+        ranked = similar_listing_ids(self.target.pk)
+        self.assertEqual([listing_id for listing_id, _ in ranked], [self.close.pk, self.far.pk])
+        self.assertLess(ranked[0][1], ranked[1][1])
+
+    def test_signals_keep_a_built_index_current(self):
+        index = get_index()
+        self.assertEqual(len(index), 3)
+        twin = create_listing(self.profile, brand='bmw', model='M3', mileage=20000,
+                              engine='3.0L', color='Blue',
+                              location=Location.objects.create(city='Dublin', state='D'))
+        self.assertEqual(similar_listing_ids(self.target.pk, 1)[0][0], twin.pk)
+        twin.delete()
+        self.far.delete()
+        self.assertEqual(len(index), 2)
+        self.assertEqual([i for i, _ in similar_listing_ids(self.target.pk)], [self.close.pk])
+
+    @override_settings(SIMILAR_INDEX_REBUILD=True)
+    def test_stale_index_is_served_while_a_thread_rebuilds_it(self):
+        index = get_index()
+        index.built_at -= settings.SIMILAR_INDEX_MAX_AGE
+        with mock.patch.object(similar.threading, 'Thread') as thread, \
+                self.assertNumQueries(0):
+            self.assertIs(get_index(), index)
+            self.assertIs(get_index(), index)
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        similar._rebuild()
+        self.assertIsNot(get_index(), index)
+        self.assertEqual(len(get_index()), 3)
+
+    def test_missing_index_is_empty_until_built(self):
+        reset_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_index()), 0)
+        self.assertEqual(similar_listing_ids(self.target.pk), [])
+
+    def test_changed_index_file_is_loaded(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'similar.npz')
+        build_index(Listing.objects.exclude(pk=self.far.pk)).save(path)
+        reset_index()
+        with override_settings(SIMILAR_INDEX_PATH=path):
+            with self.assertNumQueries(0):
+                index = get_index()
+                self.assertEqual(len(index), 2)
+                index.built_at -= settings.SIMILAR_INDEX_MAX_AGE
+                self.assertIs(get_index(), index)
+            build_index().save(path)
+            os.utime(path, (0, os.path.getmtime(path) + 1))
+            index.built_at -= settings.SIMILAR_INDEX_MAX_AGE
+            with self.assertNumQueries(0):
+                self.assertEqual(len(get_index()), 3)
+
+    def test_vectorized_distances_match_the_naive_ones(self):
+        index = build_index()
+        query = index.vector(self.target.pk)
+        rows = index.matrix[:index.size]
+        naive = sorted(((float(((row - query) ** 2).sum()), index.ids[i])
+                        for i, row in enumerate(rows) if index.ids[i] != self.target.pk))
+        nearest = index.nearest(query, k=2, exclude=self.target.pk)
+        self.assertEqual([i for i, _ in nearest], [i for _, i in naive])
+        for (_, distance), (expected, _) in zip(nearest, naive):
+            self.assertAlmostEqual(distance, expected, places=4)
+
+    def test_save_and_load_round_trip(self):
+        index = build_index()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'similar.npz')
+        index.save(path)
+        loaded = type(index).load(path)
+        self.assertEqual(len(loaded), 3)
+        self.assertTrue((loaded.vector(self.close.pk) == index.vector(self.close.pk)).all())
+
+    def test_panel_and_api(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('listing', args=[self.target.pk]))
+        self.assertEqual([l for l, _ in response.context['similar_cards']],
+                         [self.close, self.far])
+        response = self.client.get(reverse('api_similar_listings', args=[self.target.pk]))
+        results = response.json()['results']
+        self.assertEqual([row['model'] for row in results], ['M4', 'S'])
+        self.assertIn('distance', results[0])
+        missing = self.client.get(reverse('api_similar_listings', args=[uuid.uuid4()]))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_command_reports_synthetic_benchmark(self):
+        out = StringIO()
+        call_command('build_similarity_index', synthetic=2000, queries=5, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['synthetic']['listings'], 2000)
+        self.assertIn('p95_ms', report['synthetic'])
+        self.assertGreater(report['synthetic']['bytes_per_100k'], 0)
+
+
+class SavedSearchTests(ListingTestCase):
+
+    def setUp(self):
+        # the index outlives each test's rollback, so force a rebuild on both sides
+        invalidate_saved_searches()
+        self.addCleanup(invalidate_saved_searches)
+        self.buyer = User.objects.create_user('buyer', password='pass12345',
+                                              email='buyer@example.com').profile
+
+    def test_index_checks_brand_transmission_and_model_buckets(self):
+        index = SearchIndex([
+            (1, 10, 'bmw', '', 'm3'),
+            (2, 10, 'bmw', 'automatic', ''),
+            (3, 10, '', 'manual', ''),
+            (4, 10, 'audi', '', ''),
+            (5, 20, 'bmw', '', ''),
+        ])
+        self.assertEqual(sorted(index.match('bmw', 'manual', 'M3 Competition')), [1, 3, 5])
+        self.assertEqual(sorted(index.match('bmw', 'manual', 'M3', seller_id=20)), [1, 3])
+
+    def test_new_listing_is_matched_once(self):
+        wanted = SavedSearch.objects.create(profile=self.buyer, brand='bmw', model='m3')
+        SavedSearch.objects.create(profile=self.buyer, brand='audi')
+        SavedSearch.objects.create(profile=self.profile, brand='bmw')
+        listing = create_listing(self.profile, model='M3')
+        listing.save()
+        self.assertEqual(list(SavedSearchMatch.objects.values_list('saved_search', 'listing')),
+                         [(wanted.pk, listing.pk)])
+
+    def test_index_is_rebuilt_when_searches_change(self):
+        index = saved_search_index()
+        self.assertIs(saved_search_index(), index)
+        search = SavedSearch.objects.create(profile=self.buyer, transmission='manual')
+        self.assertEqual(saved_search_index().match('bmw', 'manual', 'M3'), [search.pk])
+        search.delete()
+        self.assertEqual(len(saved_search_index()), 0)
+
+    def test_digest_per_buyer(self):
+        other = User.objects.create_user('other', password='pass12345').profile
+        SavedSearch.objects.create(profile=self.buyer, brand='bmw')
+        SavedSearch.objects.create(profile=self.buyer, model='m3')
+        SavedSearch.objects.create(profile=other, brand='bmw')
+        create_listing(self.profile, model='M3')
+        create_listing(self.profile, model='X5')
+        self.assertEqual(SavedSearchMatch.objects.count(), 5)
+        with self.assertNumQueries(5):
+            self.assertEqual(queue_digests(), 2)
+        self.assertFalse(SavedSearchMatch.objects.filter(notified_at=None).exists())
+        digest = OutboxMessage.objects.get(sender=self.buyer.user)
+        self.assertEqual(digest.subject, '3 new listing(s) for your saved searches')
+        self.assertIn('BMW M3', digest.message)
+        self.assertEqual(queue_digests(), 0)
+
+    def test_save_search_view(self):
+        self.client.force_login(self.buyer.user)
+        response = self.client.post(reverse('save_search'),
+                                    {'brand': 'bmw', 'transmission': '', 'model': 'm3'})
+        self.assertRedirects(response, reverse('home') + '?brand=bmw&model__icontains=m3',
+                             fetch_redirect_response=False)
+        self.assertTrue(SavedSearch.objects.filter(profile=self.buyer, brand='bmw').exists())
+        self.client.post(reverse('save_search'), {'brand': '', 'transmission': '', 'model': ''})
+        self.assertEqual(SavedSearch.objects.count(), 1)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_saved_searches', searches=2000, listings=50,
+                     naive_sample=10, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['saved_searches'], 2000)
+        self.assertIn('p95_ms', report)
+
+
+@override_settings(VIEW_COUNT_FLUSH_SIZE=3, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class ViewCountTests(ListingTestCase):
+
+    def setUp(self):
+        view_counts.reset()
+        self.addCleanup(view_counts.reset)
+        self.listing = create_listing(self.profile, model='Supra')
+        self.client.force_login(self.user)
+
+    def view_count(self, listing=None):
+        return Listing.objects.values_list('view_count', flat=True).get(
+            pk=(listing or self.listing).pk)
+
+    def test_views_are_written_behind_in_one_update(self):
+        url = reverse('listing', args=[self.listing.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(view_counts.pending(), {self.listing.pk: 2})
+        self.assertEqual(self.view_count(), 0)
+        with CaptureQueriesContext(connections['default']) as captured:
+            self.client.get(url)
+        updates = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.view_count(), 3)
+        self.assertEqual(view_counts.pending(), {})
+
+    @override_settings(VIEW_COUNT_BATCH_SIZE=2)
+    def test_flush_batches_many_listings(self):
+        listings = [self.listing] + [create_listing(self.profile, model=f'Roadster {n}')
+                                     for n in range(2)]
+        for n, listing in enumerate(listings, 1):
+            for _ in range(n):
+                view_counts.record_view(listing.pk)
+        with self.assertNumQueries(2):
+            self.assertEqual(view_counts.flush(), 6)
+        self.assertEqual([self.view_count(l) for l in listings], [1, 2, 3])
+
+    def test_failed_flush_keeps_the_views(self):
+        view_counts.record_view(self.listing.pk)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError), \
+                self.assertLogs('main.view_counts', 'ERROR'):
+            self.assertEqual(view_counts.flush(), 0)
+        self.assertEqual(view_counts.pending(), {self.listing.pk: 1})
+        view_counts.flush()
+        self.assertEqual(self.view_count(), 1)
+
+    @override_settings(DATABASE_REPLICAS=['replica'], VIEW_COUNT_FLUSH_SIZE=1)
+    def test_flush_does_not_pin_the_viewer_to_the_primary(self):
+        @replica_reads
+        def view(request):
+            view_counts.count_view(self.listing.pk)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual(self.view_count(), 1)
+        self.assertNotIn(ReplicaRoutingMiddleware.cookie_name, response.cookies)
+
+    def test_counts_survive_a_stale_save_and_reach_the_api(self):
+        stale = Listing.objects.get(pk=self.listing.pk)
+        url = reverse('api_listing_detail', args=[self.listing.pk])
+        first = self.client.get(url)
+        view_counts.record_view(self.listing.pk)
+        view_counts.flush()
+        stale.save()
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['view_count'], 1)
+
+
+@override_settings(HOME_STREAMING=True, HOME_STREAM_PAGE_SIZE=5, HOME_STREAM_CHUNK_SIZE=2)
+class StreamingHomeTests(ListingTestCase):
+
+    def setUp(self):
+        for n in range(7):
+            create_listing(self.profile, model=f'Roadster {n}')
+        self.client.force_login(self.user)
+
+    def get(self, **params):
+        response = self.client.get(reverse('home'), params)
+        self.assertTrue(response.streaming)
+        return response, [chunk.decode() for chunk in response.streaming_content]
+
+    def test_head_comes_first_and_cards_follow_in_chunks(self):
+        response, chunks = self.get()
+        self.assertIn('name="brand"', chunks[0])
+        self.assertNotIn('Roadster', chunks[0])
+        # head, three chunks of cards for five rows, the closing grid, the pager, the tail
+        self.assertEqual(len(chunks), 7)
+        html = ''.join(chunks)
+        self.assertEqual([f'Roadster {n}' in html for n in range(7)], [False] * 2 + [True] * 5)
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_cursors_match_the_rendered_page(self):
+        _, chunks = self.get()
+        next_url = re.search(r'href="\?cursor=([^"]+)"[^>]*>Next', ''.join(chunks)).group(1)
+        _, chunks = self.get(cursor=next_url)
+        html = ''.join(chunks)
+        self.assertIn('Roadster 1', html)
+        self.assertNotIn('Next</a>', html)
+        prev_url = re.search(r'href="\?cursor=([^"]+)"[^>]*>Previous', html).group(1)
+        _, chunks = self.get(cursor=prev_url)
+        self.assertIn('Roadster 6', ''.join(chunks))
+        _, chunks = self.get(cursor='garbage')
+        self.assertIn('Roadster 6', ''.join(chunks))
+
+    def test_messages_are_shown_once(self):
+        self.client.post(reverse('save_search'), {'brand': '', 'transmission': '', 'model': ''})
+        _, chunks = self.get()
+        self.assertIn('Pick a brand', chunks[0])
+        _, chunks = self.get()
+        self.assertNotIn('Pick a brand', chunks[0])
+
+    @override_settings(ROOT_URLCONF='main.tests')
+    async def test_async_view_streams(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('home'))
+        chunks = [chunk.decode() async for chunk in response.streaming_content]
+        self.assertIn('name="brand"', chunks[0])
+        self.assertIn('Roadster 6', ''.join(chunks))
@@ -0,0 +1,48 @@
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.text import get_valid_filename
+
+from .aws import get_client
+from .utils import user_listing_prefix
+
+
+def upload_key(user, filename):
+    """Object key for a direct upload, inside the user's listings folder."""
+    return '{0}{1}_{2}'.format(
+        user_listing_prefix(user.id), uuid.uuid4().hex[:12], get_valid_filename(filename))
+
+
+def presign_listing_upload(user, filename, content_type):
+    """Return a presigned POST the browser can send the image to directly."""
+    if content_type not in settings.LISTING_UPLOAD_CONTENT_TYPES:
+        raise ValidationError(f'{content_type} images are not supported.')
+    key = upload_key(user, filename)
+    post = get_client('s3').generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=key,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, settings.LISTING_UPLOAD_MAX_BYTES],
+        ],
+        ExpiresIn=settings.LISTING_UPLOAD_EXPIRES,
+    )
+    return {'url': post['url'], 'fields': post['fields'], 'key': key}
+
+
+def verify_listing_upload(user, key):
+    """Check a finished direct upload belongs to ``user`` and is an acceptable image."""
+    if not key.startswith(user_listing_prefix(user.id)) or '..' in key:
+        raise ValidationError('This upload does not belong to you.')
+    try:
+        head = get_client('s3').head_object(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+    except Exception:
+        raise ValidationError('The uploaded image could not be found.')
+    if head['ContentLength'] > settings.LISTING_UPLOAD_MAX_BYTES:
+        raise ValidationError('The uploaded image is too large.')
+    if head.get('ContentType') not in settings.LISTING_UPLOAD_CONTENT_TYPES:
+        raise ValidationError('The uploaded file is not a supported image.')
+    return key
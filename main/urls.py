@@ -1,13 +1,26 @@
 from django.urls import path
 from django.conf import settings
-from .views import main_view,home_view,list_view,listing_view,edit_view,enquire_listing_by_email
+from .api import listing_detail_api, listings_api, similar_listings_api
+from .views import main_view,home_view,list_view,listing_view,edit_view,enquire_listing_by_email,presign_upload_view,export_listings_view,save_search_view,like_listing_view
+
+if settings.ASYNC_VIEWS:
+    # same names and behaviour, served without blocking under automotive.asgi
+    from .async_views import home_view, listing_view, enquire_listing_by_email
+
 urlpatterns = [
     path('',main_view,name='main'),
     path('home/',home_view,name='home'),
+    path('home/save-search/', save_search_view, name='save_search'),
     path('list/', list_view, name='list'),
+    path('list/upload/', presign_upload_view, name='presign_upload'),
     path('listing/<str:id>/',listing_view,name='listing'),
+    path('listing/<str:id>/like/', like_listing_view, name='like_listing'),
     path('listing/<str:id>/edit/',edit_view,name='edit'),
     path('listing/<str:id>/enquire/',enquire_listing_by_email,name='enquire_listing'), 
+    path('api/listings/', listings_api, name='api_listings'),
+    path('export/listings/', export_listings_view, name='export_listings'),
+    path('api/listings/<str:id>/', listing_detail_api, name='api_listing_detail'),
+    path('api/listings/<str:id>/similar/', similar_listings_api, name='api_similar_listings'),
       
     
     
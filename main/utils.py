@@ -1,2 +1,17 @@
+import uuid
+
+
+def user_listing_prefix(user_id):
+    return 'user_{0}/listings/'.format(user_id)
+
+
 def user_listing_path(instance, filename):
-    return 'user_{0}/listings/{1}'.format(instance.seller.user.id, filename)
\ No newline at end of file
+    return '{0}{1}'.format(user_listing_prefix(instance.seller.user.id), filename)
+
+
+def parse_uuid(value):
+    """Return ``value`` as a UUID, or None when it is not one."""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
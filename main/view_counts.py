@@ -0,0 +1,97 @@
+"""Write-behind listing view counters.
+
+Views are added up in a per-process buffer and written with one batched
+``UPDATE ... SET view_count = view_count + CASE id WHEN ... END`` per
+``VIEW_COUNT_BATCH_SIZE`` listings, so a popular listing costs one row
+update per flush instead of one per page view. The buffer is flushed by
+the first view after ``VIEW_COUNT_FLUSH_INTERVAL`` seconds or once it holds
+``VIEW_COUNT_FLUSH_SIZE`` views, and at interpreter exit. A worker that is
+killed outright loses at most those views.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from automotive.routers import unrouted
+
+from .models import Listing
+
+logger = logging.getLogger(__name__)
+
+_buffer = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def record_view(listing_id):
+    """Buffer one view of ``listing_id``; returns whether a flush is due."""
+    with _lock:
+        _buffer[listing_id] += 1
+        return (sum(_buffer.values()) >= settings.VIEW_COUNT_FLUSH_SIZE
+                or time.monotonic() - _last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL)
+
+
+def count_view(listing_id):
+    """Buffer one view and flush the buffer when it is due."""
+    if record_view(listing_id):
+        flush()
+
+
+def pending():
+    """Views buffered in this process and not yet written."""
+    with _lock:
+        return dict(_buffer)
+
+
+def flush():
+    """Write the buffered views to the database; returns how many were written.
+
+    On a database error the views go back into the buffer for the next flush.
+    """
+    global _buffer, _last_flush
+    with _lock:
+        views, _buffer = _buffer, Counter()
+        _last_flush = time.monotonic()
+    # a stable order keeps concurrent flushes from locking rows in opposite orders
+    listing_ids = sorted(views, key=str)
+    size = settings.VIEW_COUNT_BATCH_SIZE
+    written = 0
+    try:
+        # shared bookkeeping, not this request's write: the viewer stays on the replicas
+        with unrouted():
+            for start in range(0, len(listing_ids), size):
+                batch = listing_ids[start:start + size]
+                increment = Case(*[When(pk=listing_id, then=Value(views[listing_id]))
+                                   for listing_id in batch],
+                                 default=Value(0), output_field=PositiveIntegerField())
+                Listing.objects.filter(pk__in=batch).update(
+                    view_count=F('view_count') + increment)
+                written += sum(views.pop(listing_id) for listing_id in batch)
+    except DatabaseError:
+        logger.exception('Flushing %d listing view counts failed', len(views))
+        with _lock:
+            _buffer.update(views)
+    return written
+
+
+def reset():
+    """Drop the buffered views without writing them."""
+    global _last_flush
+    with _lock:
+        _buffer.clear()
+        _last_flush = time.monotonic()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _buffer:
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing listing view counts at exit failed')
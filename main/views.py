@@ -3,28 +3,54 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
 from .models import Listing
-from .forms import ListingForm
+from .forms import ListingForm, SavedSearchForm
 from users.forms import LocationForm 
 from .filters import ListingFilter
+from .pagination import InvalidCursor, paginate
+from .caching import listing_detail, render_listing_cards
 from django.core.mail import send_mail
 from django.conf import settings
-from main.sns_email import send_sns_email
-import boto3
+from .outbox import enqueue, publish_now
+from automotive.routers import replica_reads
+from django.contrib.admin.views.decorators import staff_member_required
+from .exports import EXPORT_FORMATS, streaming_export_response
+from .uploads import presign_listing_upload
+from .similar import similar_listings
+from .likes import set_liked
+from .view_counts import count_view
+from .streaming import stream_home
+from .utils import parse_uuid
+from django.core.exceptions import ValidationError
+from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.utils.http import urlencode
 
 
 
 def main_view(request):
     return render(request,"views/main.html",{"name":"AutoVerse"})
 
+@replica_reads
 @login_required
 def home_view(request):
     #to show the listing from database
-    listings = Listing.objects.all()
+    listings = Listing.objects.select_related('seller__user', 'location')
     listing_filter = ListingFilter(request.GET,queryset=listings)
-    
+    listing_filter.add_facet_counts()
+    if settings.HOME_STREAMING:
+        return stream_home(request, listing_filter)
+    try:
+        page = paginate(listing_filter.qs, request.GET.get('cursor'),
+                        settings.LISTINGS_PAGE_SIZE, listing_filter.ordering)
+    except InvalidCursor:
+        page = paginate(listing_filter.qs, None, settings.LISTINGS_PAGE_SIZE,
+                        listing_filter.ordering)
+
     context = {
         
-        'listing_filter':listing_filter
+        'listing_filter':listing_filter,
+        'page':page,
+        'cards':render_listing_cards(page, request.user),
     }
     return render(request, "views/home.html",context)
     
@@ -32,7 +58,7 @@ def home_view(request):
 def list_view(request):
     if request.method == 'POST':
         try:
-            listing_form = ListingForm(request.POST,request.FILES)
+            listing_form = ListingForm(request.POST,request.FILES,user=request.user)
             location_form = LocationForm(request.POST,)
             
             if listing_form.is_valid() and location_form.is_valid():
@@ -41,6 +67,7 @@ def list_view(request):
                 listing.seller = request.user.profile
                 listing.location = listing_location
                 listing.save()
+                listing_form.save_m2m()
                 messages.info(request,f'{listing.model} Listing Posted Successfully!')
                 return redirect('home')
             else:
@@ -50,20 +77,33 @@ def list_view(request):
             messages.error(request,'Oops! An error occured while listing')
     elif request.method == 'GET':
         
-        listing_form = ListingForm()
+        listing_form = ListingForm(user=request.user)
         location_form = LocationForm()
     return render (request, 'views/list.html',{'listing_form':listing_form,'location_form':location_form,})
 
 @login_required
-def listing_view(request,id):
+@require_POST
+def presign_upload_view(request):
     try:
-        listing = Listing.objects.get(id=id)
-        if listing is None:
-            raise Exception
-        return render (request,'views/listing.html',{'listing': listing,})
-    except Exception as e:
+        upload = presign_listing_upload(
+            request.user, request.POST.get('filename', 'image'),
+            request.POST.get('content_type', ''))
+    except ValidationError as e:
+        return JsonResponse({"success": False, "message": e.messages[0]}, status=400)
+    return JsonResponse({"success": True, **upload})
+
+@replica_reads
+@login_required
+def listing_view(request,id):
+    # malformed ids are rejected before touching the cache or the database
+    listing_id = parse_uuid(id)
+    detail = listing_id and listing_detail(listing_id)
+    if not detail:
         messages.error(request,f'Invalid UID {id} was provided.')
         return redirect('home')
+    count_view(listing_id)
+    similar_cards = render_listing_cards(similar_listings(listing_id), request.user)
+    return render (request,'views/listing.html',{'detail': detail,'similar_cards': similar_cards,})
     
 @login_required
 def edit_view(request, id):
@@ -73,7 +113,7 @@ def edit_view(request, id):
             raise Exception
         if request.method == 'POST':
             listing_form = ListingForm(
-                request.POST, request.FILES, instance=listing)
+                request.POST, request.FILES, instance=listing, user=request.user)
             location_form = LocationForm(
                 request.POST, instance=listing.location)
             if listing_form.is_valid and location_form.is_valid:
@@ -86,7 +126,7 @@ def edit_view(request, id):
                     request, f'An error occured while trying to edit the listing.')
                 return reload()
         else:
-            listing_form = ListingForm(instance=listing)
+            listing_form = ListingForm(instance=listing, user=request.user)
             location_form = LocationForm(instance=listing.location)
         context = {
             'location_form': location_form,
@@ -98,24 +138,66 @@ def edit_view(request, id):
             request, f'An error occured while trying to access the edit page.')
         return redirect('home')
 
+def enquiry_email(buyer, listing):
+    """Subject and body of the email telling the seller about an enquiry."""
+    email_subject = f"{buyer.username} is interested in {listing.model}"
+    email_message = (
+        f"Hello {listing.seller.user.username},\n\n"
+        f"{buyer.username} has expressed interest in your {listing.model} listed on AutoVerse.\n"
+        f"Please get in touch with them via their contact information.\n\n"
+        "Thank you for using AutoVerse!"
+    )
+    return email_subject, email_message
+
 @login_required
 def enquire_listing_by_email(request, id):
     listing = get_object_or_404(Listing, id=id)
     try:
-        email_subject = f"{request.user.username} is interested in {listing.model}"
-        email_message = (
-            f"Hello {listing.seller.user.username},\n\n"
-            f"{request.user.username} has expressed interest in your {listing.model} listed on AutoVerse.\n"
-            f"Please get in touch with them via their contact information.\n\n"
-            "Thank you for using AutoVerse!"
-        )
-
-        response = send_sns_email(email_subject, email_message)
-
-        if response:
-            return JsonResponse({"success": True, "message": "Email sent successfully!"})
-        else:
-            return JsonResponse({"success": False, "message": "Failed to send email."}, status=500)
+        email_subject, email_message = enquiry_email(request.user, listing)
+        immediate = settings.OUTBOX_IMMEDIATE_DISPATCH
+        message = enqueue(email_subject, email_message, listing=listing,
+                          sender=request.user, hold=immediate)
+        if immediate:
+            publish_now(message)
+        return JsonResponse({"success": True, "message": "Enquiry sent! The seller will be emailed shortly."}, status=202)
     except Exception as e:
         print(f"Error: {e}")
-        return JsonResponse({"success": False, "message": str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
+
+@login_required
+@require_POST
+def like_listing_view(request, id):
+    # the client sends the state it wants, so repeating a request is harmless
+    liked = {'true': True, 'false': False}.get(request.POST.get('liked'))
+    if liked is None:
+        return JsonResponse({"success": False, "message": "liked must be true or false."}, status=400)
+    listing_id = parse_uuid(id)
+    listing = listing_id and Listing.objects.filter(id=listing_id).first()
+    if not listing:
+        return JsonResponse({"success": False, "message": "Listing not found."}, status=404)
+    like_count = set_liked(request.user.profile, listing, liked)
+    return JsonResponse({"success": True, "liked": liked, "like_count": like_count})
+
+@login_required
+@require_POST
+def save_search_view(request):
+    search_form = SavedSearchForm(request.POST)
+    if not search_form.is_valid():
+        messages.error(request, 'Pick a brand, transmission or model before saving a search.')
+        return redirect('home')
+    saved_search = search_form.save(commit=False)
+    saved_search.profile = request.user.profile
+    saved_search.save()
+    messages.info(request, f'Saved! We will email you when new {saved_search} listings appear.')
+    query = {'brand': saved_search.brand, 'transmission': saved_search.transmission,
+             'model__icontains': saved_search.model}
+    return redirect(f"{reverse('home')}?{urlencode({k: v for k, v in query.items() if v})}")
+
+@replica_reads
+@staff_member_required
+def export_listings_view(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"success": False, "message": f"Unknown format {fmt}."}, status=400)
+    listing_filter = ListingFilter(request.GET, queryset=Listing.objects.all())
+    return streaming_export_response(listing_filter.qs, fmt)
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from automotive.timing import mark
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop the cached user, e.g. after the user, profile or location changed."""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that serves ``request.user`` from the cache.
+
+    The user is cached with its profile and location already attached, so
+    views reading ``request.user.profile`` do not query either. Entries are
+    dropped by the receivers in ``users.signals`` whenever one of the three
+    rows is saved or deleted. A password change saves the user, so the next
+    request loads the new hash and Django's session check logs out the
+    other sessions as usual.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is not None:
+            mark('auth_hit')
+            return user if self.user_can_authenticate(user) else None
+        mark('auth_miss')
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related(
+                'profile__location').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
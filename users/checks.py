@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# caches that live inside one process, invisible to every other worker
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def local_cache_in_use():
+    """Whether the default cache is per process where that is not explicitly allowed."""
+    return (not settings.DEBUG and not settings.ALLOW_LOCAL_CACHE
+            and settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS)
+
+
+@register(Tags.caches)
+def check_cached_auth(app_configs, **kwargs):
+    # logout and password changes only clear the cache of the worker that handled them
+    if not local_cache_in_use():
+        return []
+    errors = []
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db':
+        errors.append(Error(
+            'Cached sessions need a cache shared by every worker.',
+            hint='Set CACHE_URL (e.g. redis://host:6379/1), or ALLOW_LOCAL_CACHE=True '
+                 'when a single process serves every request.',
+            id='users.E001'))
+    if 'users.backends.CachedModelBackend' in settings.AUTHENTICATION_BACKENDS:
+        errors.append(Error(
+            'CachedModelBackend needs a cache shared by every worker.',
+            hint='Set CACHE_URL (e.g. redis://host:6379/1), or ALLOW_LOCAL_CACHE=True '
+                 'when a single process serves every request.',
+            id='users.E002'))
+    return errors
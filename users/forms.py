@@ -2,6 +2,7 @@ from dataclasses import field
 from django import forms
 from irishgeo.fields import IrishStateField, IrishEircodeField 
 from django.contrib.auth.models import User
+from main.images import PROFILE_VARIANTS, ImageVariantsFormMixin
 from .models import Location, Profile
 from .widgets import CustomPictureImageFieldWidget
 
@@ -13,7 +14,8 @@ class UserForm(forms.ModelForm):
         fields = ('username', 'first_name', 'last_name', 'email')
 
 
-class ProfileForm(forms.ModelForm):
+class ProfileForm(ImageVariantsFormMixin, forms.ModelForm):
+    image_variants = {'photo': PROFILE_VARIANTS}
     photo = forms.ImageField(widget=CustomPictureImageFieldWidget)
     bio = forms.TextInput()
     
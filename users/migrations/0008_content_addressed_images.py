@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:16
+
+import main.fields
+import users.utils
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_alter_location_state_alter_location_zip_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='photo',
+            field=main.fields.ContentAddressedImageField(null=True, upload_to=users.utils.user_directory_path),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from email.policy import default
 from django.db import models
 from django.contrib.auth.models import User
+from main.fields import ContentAddressedImageField
 from .utils import user_directory_path
 
 class Location(models.Model):
@@ -16,7 +17,7 @@ class Location(models.Model):
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    photo = models.ImageField(upload_to=user_directory_path, null=True)
+    photo = ContentAddressedImageField(upload_to=user_directory_path, null=True)
     bio = models.CharField(max_length=140, blank=True)
     phone_number = models.CharField(max_length=12, blank=True)
     location = models.OneToOneField(
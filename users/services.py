@@ -0,0 +1,20 @@
+from django.db import transaction
+
+from .models import Location, Profile
+
+
+@transaction.atomic
+def register_user(register_form):
+    """Create the User, its Profile and the profile Location in one transaction.
+
+    Three INSERTs in total: the profile is built here with its location
+    already attached, so the post_save receivers in users.signals have
+    nothing left to do.
+    """
+    location = Location.objects.create()
+    user = register_form.save(commit=False)
+    user._profile_provisioned = True
+    user.save()
+    # assigning the user also caches the profile on it, so user.profile is free
+    Profile.objects.create(user=user, location=location)
+    return user
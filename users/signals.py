@@ -1,19 +1,24 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 
+from main.blobs import release_blob, release_replaced_blob
+
+from .backends import forget_user
 from .models import Profile, Location
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+    # users.services.register_user creates the profile itself
+    if created and not getattr(instance, '_profile_provisioned', False):
         Profile.objects.create(user=instance)
 
 
 @receiver(post_save, sender=Profile)
 def create_profile_location(sender, instance, created, **kwrags):
-    if created:
+    if created and instance.location_id is None:
         profile_location = Location.objects.create()
         instance.location = profile_location
         instance.save()
@@ -24,3 +29,45 @@ def delete_profile_location(sender,instance,*args, **kwargs):
         instance.location.delete()
 
 
+@receiver(pre_save, sender=Profile)
+def remember_profile_photo(sender, instance, **kwargs):
+    instance._previous_photo = None
+    if not instance._state.adding:
+        instance._previous_photo = Profile.objects.filter(pk=instance.pk).values_list(
+            'photo', flat=True).first()
+
+
+@receiver(post_save, sender=Profile)
+def release_replaced_profile_photo(sender, instance, **kwargs):
+    release_replaced_blob(getattr(instance, '_previous_photo', None), instance.photo)
+
+
+@receiver(post_delete, sender=Profile)
+def release_profile_photo(sender, instance, **kwargs):
+    release_blob(instance.photo.name)
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # covers password changes and the last_login update done by login()
+    forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def forget_profile_user(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Location)
+def forget_location_user(sender, instance, created=False, **kwargs):
+    # a new location has no profile yet, listing locations never get one
+    if created:
+        return
+    for user_id in Profile.objects.filter(location=instance).values_list('user_id', flat=True):
+        forget_user(user_id)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
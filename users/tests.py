@@ -1,3 +1,161 @@
-from django.test import TestCase
+from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from main.models import Listing, OutboxMessage
+
+from .backends import user_cache_key
+from .checks import check_cached_auth
+from .models import Location, Profile
+from .services import register_user
+
+REGISTER_DATA = {'username': 'newbuyer', 'password1': 'Secret-pass-123',
+                 'password2': 'Secret-pass-123'}
+
+
+def data_queries(captured):
+    # leave out BEGIN/COMMIT/SAVEPOINT, which depend on the backend and test case
+    return [q['sql'] for q in captured.captured_queries
+            if not q['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE'))]
+
+
+class RegisterUserTests(TestCase):
+
+    def test_creates_user_profile_and_location_in_three_queries(self):
+        form = UserCreationForm(REGISTER_DATA)
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as captured:
+            user = register_user(form)
+        self.assertEqual(len(data_queries(captured)), 3, data_queries(captured))
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(user.profile.location)
+        self.assertEqual(Profile.objects.count(), 1)
+        self.assertEqual(Location.objects.count(), 1)
+
+
+class RegisterViewTests(TestCase):
+
+    def test_register_logs_the_new_user_in(self):
+        response = self.client.post(reverse('register'), REGISTER_DATA)
+        self.assertRedirects(response, reverse('home'))
+        user = User.objects.get(username='newbuyer')
+        self.assertIsNotNone(user.profile.location_id)
+
+    def test_users_created_elsewhere_still_get_profile_and_location(self):
+        user = User.objects.create_user('admin-made', password='pass12345')
+        self.assertIsNotNone(Profile.objects.get(user=user).location_id)
+
+
+class ProfileListingsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller', password='pass12345')
+        other = User.objects.create_user('other', password='pass12345')
+        for number, owner in enumerate([cls.user] * 3 + [other]):
+            Listing.objects.create(
+                seller=owner.profile, brand='bmw', model=f'Roadster {number}', vin='1HGCM82633A004352',
+                mileage=1000, description='Clean car', engine='3.0L',
+                transmission='manual', image='user_1/listings/car.jpeg')
+        cls.enquired = Listing.objects.get(model='Roadster 0')
+        OutboxMessage.objects.bulk_create(
+            [OutboxMessage(subject='Hi', message='Still for sale?', listing=cls.enquired,
+                           sender=other) for _ in range(2)])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_profile_page_leaves_the_listings_to_the_fragment(self):
+        response = self.client.get(reverse('profile'))
+        self.assertContains(response, reverse('profile_listings'))
+        self.assertNotContains(response, 'Roadster')
+
+    @override_settings(PROFILE_LISTINGS_PAGE_SIZE=2)
+    def test_fragment_pages_own_listings_with_enquiry_counts(self):
+        response = self.client.get(reverse('profile_listings'))
+        page = response.context['page']
+        listings = list(page)
+        self.assertEqual([l.model for l in listings], ['Roadster 2', 'Roadster 1'])
+        self.assertTrue(page.has_next)
+        self.assertEqual(listings[0].age.days, 0)
+
+        response = self.client.get(reverse('profile_listings'), {'cursor': page.next_cursor})
+        page = response.context['page']
+        self.assertEqual([(l.model, l.enquiry_count) for l in page], [('Roadster 0', 2)])
+        self.assertFalse(page.has_next)
+
+    def test_fragment_is_a_single_listing_query(self):
+        self.client.get(reverse('profile_listings'))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('profile_listings'))
+        listing_queries = [sql for sql in data_queries(captured) if 'main_listing' in sql]
+        self.assertEqual(len(listing_queries), 1, listing_queries)
+
+
+class CachedAuthTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer', password='pass12345')
+        self.client.login(username='buyer', password='pass12345')
+
+    def test_second_request_needs_no_session_or_user_query(self):
+        self.client.get(reverse('profile'))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('profile'))
+        tables = ' '.join(data_queries(captured))
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('FROM "auth_user"', tables)
+        self.assertNotIn('FROM "users_profile"', tables)
+
+    def test_cached_user_carries_profile_and_location(self):
+        self.client.get(reverse('profile'))
+        user = cache.get(user_cache_key(self.user.pk))
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(user.profile.location.pk)
+
+    def test_profile_and_location_changes_invalidate(self):
+        self.client.get(reverse('profile'))
+        self.user.profile.location.city = 'Cork'
+        self.user.profile.location.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.get(reverse('profile'))
+        self.assertEqual(cache.get(user_cache_key(self.user.pk)).profile.location.city, 'Cork')
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get(reverse('profile'))
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-pass-456')
+        user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response.url)
+
+    def test_logout_ends_the_cached_session(self):
+        self.client.get(reverse('profile'))
+        self.client.get(reverse('logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 302)
+
+
+class CachedAuthCheckTests(TestCase):
+    LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    SHARED = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                          'LOCATION': 'redis://localhost:6379/1'}}
+
+    @override_settings(DEBUG=False, ALLOW_LOCAL_CACHE=False, CACHES=LOCAL)
+    def test_local_cache_fails_in_production(self):
+        ids = [error.id for error in check_cached_auth(None)]
+        self.assertEqual(ids, ['users.E001', 'users.E002'])
+
+    @override_settings(DEBUG=False, ALLOW_LOCAL_CACHE=False, CACHES=SHARED)
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_cached_auth(None), [])
+
+    @override_settings(DEBUG=False, ALLOW_LOCAL_CACHE=True, CACHES=LOCAL)
+    def test_local_cache_can_be_allowed(self):
+        self.assertEqual(check_cached_auth(None), [])
@@ -1,11 +1,13 @@
 from django.urls import path
-from  .views import login_view,RegisterView,logout_view,ProfileView
+from automotive.routers import replica_reads
+from  .views import login_view,RegisterView,logout_view,ProfileView,profile_listings_view
 
 urlpatterns = [
     path('login/',login_view,name='login'),
     path('register/',RegisterView.as_view(),name='register'),
     path('logout/',logout_view,name='logout'),
-    path('profile/',ProfileView.as_view(), name='profile'),
+    path('profile/',replica_reads(ProfileView.as_view()), name='profile'),
+    path('profile/listings/',profile_listings_view, name='profile_listings'),
     
     
 ]
@@ -6,9 +6,15 @@ from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.views import View
+from django.conf import settings
+from django.db.models import Count, DurationField, ExpressionWrapper, F
+from django.db.models.functions import Now
 
+from automotive.routers import replica_reads
 from main.models import Listing
+from main.pagination import InvalidCursor, paginate
 from .forms import UserForm, ProfileForm, LocationForm
+from .services import register_user
 
 
 def login_view(request):
@@ -47,8 +53,7 @@ class RegisterView(View):
     def post(self, request):
         register_form = UserCreationForm(request.POST)
         if register_form.is_valid():
-            user = register_form.save()
-            user.refresh_from_db()
+            user = register_user(register_form)
             login(request, user)
             messages.success(
                 request, f'User {user.username} registered successfully.')
@@ -61,24 +66,27 @@ class RegisterView(View):
 @method_decorator(login_required, name='dispatch')
 class ProfileView(View):
 
+    def get_profile(self, request):
+        # CachedModelBackend loads the user with its profile and location attached
+        return request.user.profile
+
     def get(self, request):
-        user_listings = Listing.objects.filter(seller=request.user.profile)
-        user_form = UserForm(instance=request.user)
-        profile_form = ProfileForm(instance=request.user.profile)
-        location_form = LocationForm(instance=request.user.profile.location)
+        profile = self.get_profile(request)
+        user_form = UserForm(instance=profile.user)
+        profile_form = ProfileForm(instance=profile)
+        location_form = LocationForm(instance=profile.location)
         return render(request, 'views/profile.html', {'user_form': user_form,
                                                       'profile_form': profile_form,
                                                       'location_form': location_form,
-                                                      'user_listings': user_listings,
                                                       })
 
     def post(self, request):
-        user_listings = Listing.objects.filter(seller=request.user.profile)
-        user_form = UserForm(request.POST, instance=request.user)
+        profile = self.get_profile(request)
+        user_form = UserForm(request.POST, instance=profile.user)
         profile_form = ProfileForm(
-            request.POST, request.FILES, instance=request.user.profile)
+            request.POST, request.FILES, instance=profile)
         location_form = LocationForm(
-            request.POST, instance=request.user.profile.location)
+            request.POST, instance=profile.location)
         if user_form.is_valid() and profile_form.is_valid() and location_form.is_valid():
             user_form.save()
             profile_form.save()
@@ -90,5 +98,19 @@ class ProfileView(View):
         return render(request, 'views/profile.html', {'user_form': user_form,
                                                       'profile_form': profile_form,
                                                       'location_form': location_form,
-                                                      'user_listings': user_listings,
                                                        })
+
+
+@replica_reads
+@login_required
+def profile_listings_view(request):
+    """One page of the seller's listings, loaded into the profile page over AJAX."""
+    listings = (Listing.objects.filter(seller__user=request.user)
+                .annotate(enquiry_count=Count('outbox_messages'),
+                          age=ExpressionWrapper(Now() - F('created_at'),
+                                                output_field=DurationField())))
+    try:
+        page = paginate(listings, request.GET.get('cursor'), settings.PROFILE_LISTINGS_PAGE_SIZE)
+    except InvalidCursor:
+        page = paginate(listings, None, settings.PROFILE_LISTINGS_PAGE_SIZE)
+    return render(request, 'components/profile_listings.html', {'page': page})